@@ -9,6 +9,47 @@ const Analysis: React.FC = () => {
   const [ctr, setCtr] = useState(0.03);
   const [output, setOutput] = useState<any>('—');
   const [loading, setLoading] = useState(false);
+  const [research, setResearch] = useState('');
+  const [researching, setResearching] = useState(false);
+
+  async function streamResearch() {
+    setResearching(true);
+    setResearch('');
+    try {
+      const response = await fetch('/api/agents/stream', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ prompt: topic, params: { agent: 'research', topic } })
+      });
+      if (!response.body) throw new Error('Streaming is not supported by this browser');
+
+      // Server-sent events: "event:" and "data:" lines, one blank line between events
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        let end;
+        while ((end = buffer.indexOf('\n\n')) >= 0) {
+          const block = buffer.slice(0, end);
+          buffer = buffer.slice(end + 2);
+          const event = block.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(block.match(/^data: (.*)$/m)?.[1] || '{}');
+
+          if (event === 'token') setResearch((text) => text + data.text);
+          else if (event === 'result') setResearch(data.summary || JSON.stringify(data, null, 2));
+          else if (event === 'error') setResearch((text) => `${text}\n[${data.error}]`);
+        }
+      }
+    } catch (error) {
+      setResearch(`Error: ${error.message}`);
+    } finally {
+      setResearching(false);
+    }
+  }
 
   async function createInsight() {
     setLoading(true);
@@ -74,6 +115,23 @@ const Analysis: React.FC = () => {
         {loading ? 'Creating...' : 'Create Insight'}
       </button>
 
+      <button
+        onClick={streamResearch}
+        disabled={researching}
+        className="btn btn-primary"
+      >
+        {researching ? 'Researching...' : 'Research Topic with AI'}
+      </button>
+
+      {(research || researching) && (
+        <div className="result-section">
+          <h3>AI Research:</h3>
+          <pre className="result-output">
+            {research || '…'}
+          </pre>
+        </div>
+      )}
+
       <div className="result-section">
         <h3>Result:</h3>
         <pre className="result-output">
@@ -107,6 +165,7 @@ const Marketing: React.FC = () => {
   
   const [output, setOutput] = useState<any>('—');
   const [loading, setLoading] = useState(false);
+  const [groupBy, setGroupBy] = useState('campaign');
 
   async function createCampaign() {
     setLoading(true);
@@ -144,6 +203,20 @@ const Marketing: React.FC = () => {
     }
   }
 
+  async function loadPerformance() {
+    setLoading(true);
+    try {
+      // Totals and CTR/CPC/CPA/ROAS are computed server-side
+      const response = await fetch(`/api/marketing/metrics/aggregate?group_by=${groupBy}`);
+      const result = await response.json();
+      setOutput(result);
+    } catch (error) {
+      setOutput({ error: error.message });
+    } finally {
+      setLoading(false);
+    }
+  }
+
   return (
     <main className="page-container marketing-page">
       <h1>Marketing Dashboard</h1>
@@ -276,6 +349,33 @@ const Marketing: React.FC = () => {
             {loading ? 'Adding...' : 'Add Metrics'}
           </button>
         </div>
+
+        {/* Performance Summary */}
+        <div className="marketing-section">
+          <h2>Performance</h2>
+          <div className="form-group">
+            <label className="form-label">Group By:</label>
+            <select
+              value={groupBy}
+              onChange={(e) => setGroupBy(e.target.value)}
+              className="form-select"
+            >
+              <option value="campaign">Campaign</option>
+              <option value="platform">Platform</option>
+              <option value="day">Day</option>
+              <option value="week">Week</option>
+              <option value="month">Month</option>
+            </select>
+          </div>
+
+          <button
+            onClick={loadPerformance}
+            disabled={loading}
+            className="btn btn-primary"
+          >
+            {loading ? 'Loading...' : 'Load Performance'}
+          </button>
+        </div>
       </div>
 
       <div className="result-section">
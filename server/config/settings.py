@@ -20,12 +20,81 @@ class Config:
     N8N_API_KEY = os.getenv('N8N_API_KEY', '')
     N8N_TIMEOUT_SECONDS = float(os.getenv('N8N_TIMEOUT_SECONDS', '30'))
     N8N_WEBHOOK_URL = os.getenv('N8N_WEBHOOK_URL', '')
+    N8N_POOL_SIZE = int(os.getenv('N8N_POOL_SIZE', '10'))
+    N8N_CONNECT_TIMEOUT = float(os.getenv('N8N_CONNECT_TIMEOUT', '5'))
+    N8N_MAX_RETRIES = int(os.getenv('N8N_MAX_RETRIES', '2'))
+    N8N_RETRY_BACKOFF = float(os.getenv('N8N_RETRY_BACKOFF', '0.5'))
+    N8N_BREAKER_FAILURES = int(os.getenv('N8N_BREAKER_FAILURES', '5'))
+    N8N_BREAKER_RESET_SECONDS = float(os.getenv('N8N_BREAKER_RESET_SECONDS', '30'))
+    N8N_FANOUT_CONCURRENCY = int(os.getenv('N8N_FANOUT_CONCURRENCY', '8'))
+    N8N_FANOUT_MAX_ITEMS = int(os.getenv('N8N_FANOUT_MAX_ITEMS', '100'))
+    N8N_DISPATCH_WORKERS = int(os.getenv('N8N_DISPATCH_WORKERS', '4'))
+    N8N_DISPATCH_MAX_PENDING = int(os.getenv('N8N_DISPATCH_MAX_PENDING', '1000'))
+    N8N_DISPATCH_MAX_ATTEMPTS = int(os.getenv('N8N_DISPATCH_MAX_ATTEMPTS', '5'))
+    N8N_DISPATCH_RETRY_BACKOFF = float(os.getenv('N8N_DISPATCH_RETRY_BACKOFF', '2'))
+    N8N_DISPATCH_BATCH_SIZE = int(os.getenv('N8N_DISPATCH_BATCH_SIZE', '20'))
+    N8N_DISPATCH_BATCH_WAIT = float(os.getenv('N8N_DISPATCH_BATCH_WAIT', '0.5'))
+    N8N_DISPATCH_SPOOL_PATH = os.getenv('N8N_DISPATCH_SPOOL_PATH', '')
     
     # OpenAI settings
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY', '')
     OPENAI_MODEL = os.getenv('OPENAI_MODEL', 'gpt-3.5-turbo')
     OPENAI_MAX_TOKENS = int(os.getenv('OPENAI_MAX_TOKENS', '1000'))
     OPENAI_TEMPERATURE = float(os.getenv('OPENAI_TEMPERATURE', '0.7'))
+    OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+    OPENAI_POOL_SIZE = int(os.getenv('OPENAI_POOL_SIZE', '10'))
+    OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', '5'))
+    OPENAI_READ_TIMEOUT = float(os.getenv('OPENAI_READ_TIMEOUT', '30'))
+    OPENAI_MAX_CONCURRENCY = int(os.getenv('OPENAI_MAX_CONCURRENCY', os.getenv('OPENAI_POOL_SIZE', '10')))
+    OPENAI_MAX_RETRIES = int(os.getenv('OPENAI_MAX_RETRIES', '2'))
+    OPENAI_RETRY_BACKOFF = float(os.getenv('OPENAI_RETRY_BACKOFF', '0.5'))
+    
+    # LLM response cache: memory, redis (shared via REDIS_URL) or none
+    LLM_CACHE_BACKEND = os.getenv('LLM_CACHE_BACKEND', 'memory')
+    LLM_CACHE_SIZE = int(os.getenv('LLM_CACHE_SIZE', '1000'))
+    LLM_CACHE_TTL = float(os.getenv('LLM_CACHE_TTL', '3600'))
+    
+    # Background agent jobs (POST /api/agents/route with "async": true)
+    AGENT_JOB_WORKERS = int(os.getenv('AGENT_JOB_WORKERS', '4'))
+    AGENT_JOB_MAX_PENDING = int(os.getenv('AGENT_JOB_MAX_PENDING', '100'))
+    AGENT_JOB_TTL = float(os.getenv('AGENT_JOB_TTL', '3600'))
+    AGENT_JOB_MAX_WAIT = float(os.getenv('AGENT_JOB_MAX_WAIT', '30'))
+    
+    # Batch agent routing (POST /api/agents/batch): worker threads per batch and
+    # per-agent concurrency, e.g. "scrape=2,enrich=8"; other agents get the default
+    AGENT_BATCH_MAX_ITEMS = int(os.getenv('AGENT_BATCH_MAX_ITEMS', '1000'))
+    AGENT_BATCH_WORKERS = int(os.getenv('AGENT_BATCH_WORKERS', '16'))
+    AGENT_BATCH_DEFAULT_LIMIT = int(os.getenv('AGENT_BATCH_DEFAULT_LIMIT', '4'))
+    AGENT_BATCH_LIMITS = {
+        agent.strip(): int(limit)
+        for agent, limit in (pair.split('=') for pair in os.getenv('AGENT_BATCH_LIMITS', 'scrape=2,enrich=8').split(',') if pair.strip())
+    }
+    
+    # Prompt routing rules in priority order, e.g. "leadgen=lead|buyer;scrape=url|http";
+    # empty keeps the built-in rules of AgentService.ROUTES
+    AGENT_ROUTES = [
+        (agent.strip(), tuple(k.strip() for k in keywords.split('|') if k.strip()))
+        for agent, keywords in (rule.split('=', 1) for rule in os.getenv('AGENT_ROUTES', '').split(';') if rule.strip())
+    ]
+    
+    # Keep-alive connections the scrape agent holds per worker
+    SCRAPE_POOL_SIZE = int(os.getenv('SCRAPE_POOL_SIZE', '10'))
+    # Page text extraction: lxml (incremental, stops at the extract limit) or bs4 (BeautifulSoup html.parser)
+    SCRAPE_EXTRACTOR = os.getenv('SCRAPE_EXTRACTOR', 'lxml').lower()
+    # Largest page body the scrape agent downloads, in MB
+    SCRAPE_MAX_PAGE_MB = float(os.getenv('SCRAPE_MAX_PAGE_MB', '5'))
+    
+    # On-disk cache of scraped pages revalidated with conditional GETs (off unless a path is set)
+    SCRAPE_CACHE_PATH = os.getenv('SCRAPE_CACHE_PATH', '')
+    SCRAPE_CACHE_MAX_MB = float(os.getenv('SCRAPE_CACHE_MAX_MB', '50'))
+    
+    # Scrape crawl mode (several URLs or params.depth > 0): concurrent fetches,
+    # requests in flight per host, seconds between requests to one host, and limits
+    SCRAPE_CRAWL_WORKERS = int(os.getenv('SCRAPE_CRAWL_WORKERS', '8'))
+    SCRAPE_PER_HOST_LIMIT = int(os.getenv('SCRAPE_PER_HOST_LIMIT', '2'))
+    SCRAPE_POLITENESS_DELAY = float(os.getenv('SCRAPE_POLITENESS_DELAY', '0.5'))
+    SCRAPE_CRAWL_MAX_PAGES = int(os.getenv('SCRAPE_CRAWL_MAX_PAGES', '50'))
+    SCRAPE_CRAWL_MAX_DEPTH = int(os.getenv('SCRAPE_CRAWL_MAX_DEPTH', '2'))
     
     # Database settings
     DATABASE_URL = os.getenv('DATABASE_URL', 'sqlite:///egy_discovery.db')
@@ -1,74 +1,279 @@
-from flask import request, jsonify
-from datetime import datetime, date
-from typing import Dict, Any, List
+from flask import request, jsonify, Response
+from typing import Dict, Any, List, Iterator
+import csv
+import io
 import json
+from config.settings import Config
+from storage import create_storage, encode_cursor, decode_cursor, row_key, GRAINS
 
 class AccountingController:
     """Controller for accounting, marketing, and analysis operations"""
     
-    def __init__(self):
-        # In-memory storage for demo purposes
-        # In production, use database
-        self.transactions = []
-        self.campaigns = []
-        self.metrics = []
-        self.insights = []
-        self.suggestions = []
-        self._counter = 1
-    
-    def _get_next_id(self) -> int:
-        """Get next available ID"""
-        self._counter += 1
-        return self._counter - 1
+    # Largest page a client may request with ?limit=
+    MAX_PAGE_SIZE = 1000
+    
+    # Largest number of rows accepted by one bulk ingest request
+    MAX_BULK_ROWS = 50000
+    
+    # Integers SQLite can store (signed 64-bit); larger ones are refused on every backend
+    INT_RANGE = (-2 ** 63, 2 ** 63 - 1)
+    
+    # Rows fetched from storage per export chunk
+    EXPORT_BATCH_SIZE = 1000
+    
+    # Column order of CSV exports
+    EXPORT_FIELDS = {
+        'transactions': ('id', 'date', 'type', 'account', 'counterparty', 'currency', 'amount',
+                         'category', 'description', 'meta', 'created_at'),
+        'metrics': ('id', 'campaign_id', 'date', 'impressions', 'clicks', 'spend', 'conversions',
+                    'revenue', 'metrics', 'created_at')
+    }
+    
+    # Supported metric groupings and the field naming each group in responses
+    METRIC_GROUPS = {
+        'campaign': 'campaign_id',
+        'platform': 'platform',
+        'day': 'period',
+        'week': 'period',
+        'month': 'period'
+    }
+    
+    def __init__(self, storage=None):
+        # Backend selected by DATABASE_URL (SQLite by default)
+        self.storage = storage or create_storage(Config.DATABASE_URL)
+    
+    def _list_page(self, collection: str, filters: Dict[str, Any], default_limit: int):
+        """Serve one newest-first page, continuing from the ?cursor= of the previous page"""
+        try:
+            limit = int(request.args.get('limit', default_limit))
+            cursor = request.args.get('cursor')
+            after = decode_cursor(collection, cursor) if cursor else None
+        except ValueError as e:
+            return jsonify({"error": f"Invalid pagination parameters: {e}"}), 400
+        
+        if not 1 <= limit <= self.MAX_PAGE_SIZE:
+            return jsonify({"error": f"limit must be between 1 and {self.MAX_PAGE_SIZE}"}), 400
+        
+        # Fetch one extra row to know whether another page exists
+        rows = self.storage.list(collection, filters, limit=limit + 1, after=after)
+        response = jsonify(rows[:limit])
+        if len(rows) > limit:
+            response.headers['X-Next-Cursor'] = encode_cursor(collection, rows[limit - 1])
+        return response
+    
+    def _read_bulk_rows(self) -> List[Any]:
+        """Parse a bulk body: a JSON array, or one JSON object per line (NDJSON)"""
+        if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+            rows = []
+            for line in request.get_data(as_text=True).splitlines():
+                if not line.strip():
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except ValueError as e:
+                    # Keep the row slot so errors are reported against the right line
+                    rows.append(ValueError(f"Invalid JSON: {e}"))
+            return rows
+        
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError("Body must be a JSON array or NDJSON")
+        return data
+    
+    def _create_bulk(self, collection: str, build) -> Dict[str, Any]:
+        """Validate every row, store the valid ones in one write and report per-row errors"""
+        try:
+            try:
+                items = self._read_bulk_rows()
+            except ValueError as e:
+                return jsonify({"error": str(e)}), 400
+            
+            if len(items) > self.MAX_BULK_ROWS:
+                return jsonify({"error": f"At most {self.MAX_BULK_ROWS} rows per request"}), 413
+            
+            rows, positions, errors = [], [], []
+            for index, item in enumerate(items):
+                try:
+                    if isinstance(item, Exception):
+                        raise item
+                    rows.append(build(item))
+                    positions.append(index)
+                except (ValueError, TypeError) as e:
+                    errors.append({"index": index, "error": str(e)})
+            
+            records = self.storage.insert_many(collection, rows) if rows else []
+            
+            # ids line up with the submitted rows; rejected rows get null
+            ids = [None] * len(items)
+            for index, record in zip(positions, records):
+                ids[index] = record['id']
+            
+            result = {
+                "inserted": len(records),
+                "failed": len(errors),
+                "ids": ids,
+                "errors": errors
+            }
+            return jsonify(result), 201 if records or not errors else 400
+            
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def _iter_batches(self, collection: str, filters: Dict[str, Any]) -> Iterator[List[Dict[str, Any]]]:
+        """Walk a whole collection newest first, one keyset page at a time"""
+        after = None
+        while True:
+            rows = self.storage.list(collection, filters, limit=self.EXPORT_BATCH_SIZE, after=after)
+            if rows:
+                yield rows
+            if len(rows) < self.EXPORT_BATCH_SIZE:
+                return
+            after = row_key(collection, rows[-1])
+    
+    def _export(self, collection: str, filters: Dict[str, Any]) -> Response:
+        """Stream a collection as NDJSON or CSV without materializing the result"""
+        export_format = request.args.get('format', 'ndjson')
+        fields = self.EXPORT_FIELDS[collection]
+        
+        def ndjson():
+            for rows in self._iter_batches(collection, filters):
+                yield ''.join(json.dumps(r) + '\n' for r in rows)
+        
+        def csv_rows():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(fields)
+            for rows in self._iter_batches(collection, filters):
+                for r in rows:
+                    writer.writerow([json.dumps(r[f]) if isinstance(r[f], (dict, list)) else r[f] for f in fields])
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            # Header only, when nothing matched
+            if buffer.tell():
+                yield buffer.getvalue()
+        
+        if export_format == 'ndjson':
+            body, mimetype = ndjson(), 'application/x-ndjson'
+        elif export_format == 'csv':
+            body, mimetype = csv_rows(), 'text/csv'
+        else:
+            return jsonify({"error": "format must be one of: ndjson, csv"}), 400
+        
+        return Response(body, mimetype=mimetype, headers={
+            "Content-Disposition": f"attachment; filename={collection}.{export_format}"
+        })
+    
+    def _rollups(self, collection: str, filters: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Read daily or monthly running totals selected by the query string"""
+        grain = request.args.get('grain', 'day')
+        if grain not in GRAINS:
+            raise ValueError(f"grain must be one of: {', '.join(GRAINS)}")
+        
+        return self.storage.rollups(
+            collection,
+            grain,
+            filters,
+            date_from=request.args.get('from') or None,
+            date_to=request.args.get('to') or None
+        )
+    
+    def _text(self, data: Dict[str, Any], field: str, default: Any = None) -> str:
+        """A string field of a payload; raises ValueError for null or non-string values"""
+        value = data.get(field, default)
+        if not isinstance(value, str):
+            raise ValueError(f"{field} must be a string")
+        return value
+    
+    def _number(self, data: Dict[str, Any], field: str, kind: type, default: Any = 0):
+        """A numeric field of a payload converted to ``kind``; raises ValueError for null or non-numeric values"""
+        try:
+            value = kind(data.get(field, default))
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError(f"{field} must be a number")
+        return self._in_range(field, value)
+    
+    def _in_range(self, field: str, value: Any) -> Any:
+        """``value``, or ValueError if it is an integer too large to store"""
+        if type(value) is int and not self.INT_RANGE[0] <= value <= self.INT_RANGE[1]:
+            raise ValueError(f"{field} must be between {self.INT_RANGE[0]} and {self.INT_RANGE[1]}")
+        return value
+    
+    def _build_transaction(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a transaction payload and build the row to store"""
+        if not isinstance(data, dict):
+            raise ValueError("Transaction must be a JSON object")
+        
+        # Validate required fields
+        required_fields = ['date', 'type', 'account', 'amount', 'category']
+        for field in required_fields:
+            if field not in data:
+                raise ValueError(f"Missing required field: {field}")
+        
+        return {
+            "date": self._text(data, 'date'),
+            "type": self._text(data, 'type'),
+            "account": self._text(data, 'account'),
+            "counterparty": data.get('counterparty'),
+            "currency": self._text(data, 'currency', 'USD'),
+            "amount": self._number(data, 'amount', float),
+            "category": self._text(data, 'category'),
+            "description": data.get('description'),
+            "meta": data.get('meta', {})
+        }
     
     def create_transaction(self) -> Dict[str, Any]:
         """Create a new accounting transaction"""
         try:
             data = request.get_json()
             
-            # Validate required fields
-            required_fields = ['date', 'type', 'account', 'amount', 'category']
-            for field in required_fields:
-                if field not in data:
-                    return jsonify({"error": f"Missing required field: {field}"}), 400
-            
-            # Create transaction
-            transaction = {
-                "id": self._get_next_id(),
-                "date": data['date'],
-                "type": data['type'],
-                "account": data['account'],
-                "counterparty": data.get('counterparty'),
-                "currency": data.get('currency', 'USD'),
-                "amount": float(data['amount']),
-                "category": data['category'],
-                "description": data.get('description'),
-                "meta": data.get('meta', {}),
-                "created_at": datetime.now().isoformat()
-            }
+            try:
+                transaction = self._build_transaction(data)
+            except (ValueError, TypeError) as e:
+                return jsonify({"error": str(e)}), 400
             
-            self.transactions.append(transaction)
+            transaction = self.storage.insert('transactions', transaction)
             return jsonify(transaction), 201
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
+    def create_transactions_bulk(self) -> Dict[str, Any]:
+        """Create many accounting transactions from a JSON array or NDJSON body"""
+        return self._create_bulk('transactions', self._build_transaction)
+    
+    def _transaction_filters(self) -> Dict[str, Any]:
+        """Transaction filters from the query string"""
+        return {
+            'account': request.args.get('account') or None,
+            'category': request.args.get('category') or None
+        }
+    
     def list_transactions(self) -> Dict[str, Any]:
         """List accounting transactions with optional filtering"""
         try:
-            account = request.args.get('account')
-            category = request.args.get('category')
-            
-            filtered_transactions = self.transactions
+            # Newest first by ID, 200 per page by default
+            return self._list_page('transactions', self._transaction_filters(), default_limit=200)
             
-            if account:
-                filtered_transactions = [t for t in filtered_transactions if t['account'] == account]
-            if category:
-                filtered_transactions = [t for t in filtered_transactions if t['category'] == category]
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def transaction_rollups(self) -> Dict[str, Any]:
+        """Daily or monthly transaction totals per account, category and currency"""
+        try:
+            filters = self._transaction_filters()
+            filters['currency'] = request.args.get('currency') or None
+            return jsonify(self._rollups('transactions', filters))
             
-            # Sort by ID descending and limit to 200
-            filtered_transactions.sort(key=lambda x: x['id'], reverse=True)
-            return jsonify(filtered_transactions[:200])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def export_transactions(self) -> Response:
+        """Stream accounting transactions as NDJSON or CSV"""
+        try:
+            return self._export('transactions', self._transaction_filters())
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -79,12 +284,11 @@ class AccountingController:
             data = request.get_json()
             
             # Validate required fields
-            if 'platform' not in data or 'name' not in data:
+            if data.get('platform') is None or data.get('name') is None:
                 return jsonify({"error": "Missing required fields: platform, name"}), 400
             
             # Create campaign
             campaign = {
-                "id": self._get_next_id(),
                 "platform": data['platform'],
                 "external_id": data.get('external_id'),
                 "name": data['name'],
@@ -93,11 +297,10 @@ class AccountingController:
                 "budget_daily": float(data.get('budget_daily', 0)),
                 "start_date": data.get('start_date'),
                 "end_date": data.get('end_date'),
-                "targeting": data.get('targeting', {}),
-                "created_at": datetime.now().isoformat()
+                "targeting": data.get('targeting', {})
             }
             
-            self.campaigns.append(campaign)
+            campaign = self.storage.insert('campaigns', campaign)
             return jsonify(campaign), 201
             
         except Exception as e:
@@ -108,61 +311,140 @@ class AccountingController:
         try:
             platform = request.args.get('platform')
             
-            filtered_campaigns = self.campaigns
-            
-            if platform:
-                filtered_campaigns = [c for c in filtered_campaigns if c['platform'] == platform]
-            
-            # Sort by ID descending and limit to 200
-            filtered_campaigns.sort(key=lambda x: x['id'], reverse=True)
-            return jsonify(filtered_campaigns[:200])
+            # Newest first by ID, 200 per page by default
+            return self._list_page('campaigns', {
+                'platform': platform or None
+            }, default_limit=200)
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
+    def _build_metric(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Validate a metric payload and build the row to store"""
+        if not isinstance(data, dict):
+            raise ValueError("Metric must be a JSON object")
+        
+        # Validate required fields
+        if 'date' not in data:
+            raise ValueError("Missing required field: date")
+        
+        campaign_id = data.get('campaign_id')
+        if campaign_id is not None and not isinstance(campaign_id, (str, int, float)):
+            raise ValueError("campaign_id must be a scalar value or null")
+        
+        return {
+            "campaign_id": self._in_range('campaign_id', campaign_id),
+            "date": self._text(data, 'date'),
+            "impressions": self._number(data, 'impressions', int),
+            "clicks": self._number(data, 'clicks', int),
+            "spend": self._number(data, 'spend', float),
+            "conversions": self._number(data, 'conversions', int),
+            "revenue": self._number(data, 'revenue', float),
+            "metrics": data.get('metrics', {})
+        }
+    
     def create_metric(self) -> Dict[str, Any]:
         """Create a new ad metric"""
         try:
             data = request.get_json()
             
-            # Validate required fields
-            if 'date' not in data:
-                return jsonify({"error": "Missing required field: date"}), 400
-            
-            # Create metric
-            metric = {
-                "id": self._get_next_id(),
-                "campaign_id": data.get('campaign_id'),
-                "date": data['date'],
-                "impressions": int(data.get('impressions', 0)),
-                "clicks": int(data.get('clicks', 0)),
-                "spend": float(data.get('spend', 0)),
-                "conversions": int(data.get('conversions', 0)),
-                "revenue": float(data.get('revenue', 0)),
-                "metrics": data.get('metrics', {}),
-                "created_at": datetime.now().isoformat()
-            }
+            try:
+                metric = self._build_metric(data)
+            except (ValueError, TypeError) as e:
+                return jsonify({"error": str(e)}), 400
             
-            self.metrics.append(metric)
+            metric = self.storage.insert('metrics', metric)
             return jsonify(metric), 201
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
+    def create_metrics_bulk(self) -> Dict[str, Any]:
+        """Create many ad metrics from a JSON array or NDJSON body"""
+        return self._create_bulk('metrics', self._build_metric)
+    
+    def _metric_filters(self) -> Dict[str, Any]:
+        """Metric filters from the query string; raises ValueError on a campaign_id that isn't an integer"""
+        campaign_id = request.args.get('campaign_id')
+        try:
+            campaign_id = int(campaign_id) if campaign_id else None
+        except ValueError:
+            raise ValueError(f"campaign_id must be an integer, got {campaign_id!r}")
+        return {
+            'campaign_id': campaign_id
+        }
+    
     def list_metrics(self) -> Dict[str, Any]:
         """List ad metrics with optional filtering"""
         try:
-            campaign_id = request.args.get('campaign_id')
+            # Newest first by date, then ID, 500 per page by default
+            return self._list_page('metrics', self._metric_filters(), default_limit=500)
             
-            filtered_metrics = self.metrics
-            
-            if campaign_id:
-                filtered_metrics = [m for m in filtered_metrics if m['campaign_id'] == int(campaign_id)]
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def export_metrics(self) -> Response:
+        """Stream ad metrics as NDJSON or CSV"""
+        try:
+            return self._export('metrics', self._metric_filters())
             
-            # Sort by date descending, then ID descending, and limit to 500
-            filtered_metrics.sort(key=lambda x: (x['date'], x['id']), reverse=True)
-            return jsonify(filtered_metrics[:500])
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def _with_ratios(self, totals: Dict[str, Any]) -> Dict[str, Any]:
+        """Add CTR, CPC, CPA and ROAS to summed metric counters"""
+        def ratio(numerator, denominator):
+            return round(numerator / denominator, 4) if denominator else None
+        
+        return {
+            **totals,
+            "ctr": ratio(totals['clicks'], totals['impressions']),
+            "cpc": ratio(totals['spend'], totals['clicks']),
+            "cpa": ratio(totals['spend'], totals['conversions']),
+            "roas": ratio(totals['revenue'], totals['spend'])
+        }
+    
+    def metric_rollups(self) -> Dict[str, Any]:
+        """Daily or monthly metric totals per campaign"""
+        try:
+            rows = self._rollups('metrics', self._metric_filters())
+            return jsonify([self._with_ratios(r) for r in rows])
             
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+    
+    def aggregate_metrics(self) -> Dict[str, Any]:
+        """Aggregate ad metrics by campaign, platform, day, week or month"""
+        try:
+            group_by = request.args.get('group_by', 'campaign')
+            if group_by not in self.METRIC_GROUPS:
+                return jsonify({"error": f"group_by must be one of: {', '.join(self.METRIC_GROUPS)}"}), 400
+            
+            groups = self.storage.aggregate_metrics(
+                group_by,
+                self._metric_filters(),
+                date_from=request.args.get('from') or None,
+                date_to=request.args.get('to') or None
+            )
+            
+            counters = ('impressions', 'clicks', 'spend', 'conversions', 'revenue', 'rows')
+            overall = {c: sum(g[c] or 0 for g in groups) for c in counters}
+            key_field = self.METRIC_GROUPS[group_by]
+            
+            return jsonify({
+                "group_by": group_by,
+                "groups": [self._with_ratios({key_field: g['key'], **{c: g[c] for c in counters}}) for g in groups],
+                "totals": self._with_ratios(overall)
+            })
+            
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             return jsonify({"error": str(e)}), 500
     
@@ -172,7 +454,7 @@ class AccountingController:
             data = request.get_json()
             
             # Validate required fields
-            if 'topic' not in data:
+            if data.get('topic') is None:
                 return jsonify({"error": "Missing required field: topic"}), 400
             
             # Calculate score based on data
@@ -192,15 +474,13 @@ class AccountingController:
             
             # Create insight
             insight = {
-                "id": self._get_next_id(),
                 "topic": data['topic'],
                 "summary": summary,
                 "score": score,
-                "data": insight_data,
-                "created_at": datetime.now().isoformat()
+                "data": insight_data
             }
             
-            self.insights.append(insight)
+            insight = self.storage.insert('insights', insight)
             return jsonify(insight), 201
             
         except Exception as e:
@@ -209,9 +489,8 @@ class AccountingController:
     def list_insights(self) -> Dict[str, Any]:
         """List market insights"""
         try:
-            # Sort by ID descending and limit to 200
-            sorted_insights = sorted(self.insights, key=lambda x: x['id'], reverse=True)
-            return jsonify(sorted_insights[:200])
+            # Newest first by ID, 200 per page by default
+            return self._list_page('insights', {}, default_limit=200)
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
@@ -222,19 +501,17 @@ class AccountingController:
             data = request.get_json()
             
             # Validate required fields
-            if 'title' not in data or 'body' not in data:
+            if data.get('title') is None or data.get('body') is None:
                 return jsonify({"error": "Missing required fields: title, body"}), 400
             
             # Create suggestion
             suggestion = {
-                "id": self._get_next_id(),
                 "title": data['title'],
                 "body": data['body'],
-                "tags": data.get('tags', 'analysis,plan'),
-                "created_at": datetime.now().isoformat()
+                "tags": data.get('tags', 'analysis,plan')
             }
             
-            self.suggestions.append(suggestion)
+            suggestion = self.storage.insert('suggestions', suggestion)
             return jsonify(suggestion), 201
             
         except Exception as e:
@@ -243,9 +520,8 @@ class AccountingController:
     def list_suggestions(self) -> Dict[str, Any]:
         """List plan suggestions"""
         try:
-            # Sort by ID descending and limit to 200
-            sorted_suggestions = sorted(self.suggestions, key=lambda x: x['id'], reverse=True)
-            return jsonify(sorted_suggestions[:200])
+            # Newest first by ID, 200 per page by default
+            return self._list_page('suggestions', {}, default_limit=200)
             
         except Exception as e:
             return jsonify({"error": str(e)}), 500
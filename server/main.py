@@ -8,7 +8,11 @@ sys.path.insert(0, server_dir)
 
 from flask import Flask, send_from_directory, jsonify
 from config.settings import Config
-from routes.api_routes import register_routes
+from routes.api_routes import register_routes, accounting_controller
+from services.agent_service import AgentService
+from services.agent_jobs import AgentJobRunner
+from services.n8n_service import N8NService
+from services.webhook_dispatcher import WebhookDispatcher
 
 # Ensure proper MIME types for JavaScript modules
 mimetypes.add_type('application/javascript', '.js')
@@ -35,6 +39,17 @@ def create_app():
     # Load configuration
     app.config.from_object(Config)
     
+    # Long-lived agent components shared by every request of this worker
+    agent_service = AgentService()
+    app.extensions['agent_service'] = agent_service
+    app.extensions['agent_jobs'] = AgentJobRunner(agent_service.run)
+    n8n_service = N8NService()
+    app.extensions['n8n_service'] = n8n_service
+    n8n_dispatcher = WebhookDispatcher(n8n_service)
+    app.extensions['n8n_dispatcher'] = n8n_dispatcher
+    # Workers start in the process serving requests, so spooled events resume after a restart
+    app.before_request(n8n_dispatcher.start)
+    
     # Register API routes FIRST (higher priority)
     register_routes(app)
     
@@ -65,6 +80,14 @@ def create_app():
         # For SPA routing, serve index.html
         return send_from_directory(app.static_folder, 'index.html')
     
+    # CLI commands
+    @app.cli.command('rebuild-rollups')
+    def rebuild_rollups():
+        """Recompute metric and transaction rollups from the raw rows"""
+        counts = accounting_controller.storage.rebuild_rollups()
+        for collection, count in counts.items():
+            print(f"{collection}: {count} rollup rows")
+    
     # Error handlers
     @app.errorhandler(404)
     def not_found(error):
@@ -1,3 +1,4 @@
 # Models package
 from .n8n_request import *
 from .accounting import *
+from .agent_job import *
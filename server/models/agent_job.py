@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+from typing import Optional, Dict, Any
+
+@dataclass
+class AgentJob:
+    """Model for an agent prompt run in the background"""
+    id: str
+    agent: str
+    status: str = "queued"
+    created_at: Optional[str] = None
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
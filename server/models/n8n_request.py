@@ -23,3 +23,6 @@ class N8NResponse:
     status_code: int
     body: Any
     success: bool
+    elapsed_ms: Optional[float] = None
+    # Refused by the circuit breaker without calling N8N
+    fast_failed: bool = False
@@ -1,4 +1,8 @@
-from flask import Blueprint, request
+import json
+import re
+import time
+from dataclasses import asdict
+from flask import Blueprint, Response, current_app, request
 from controllers.accounting_controller import AccountingController
 
 # Create blueprints
@@ -11,6 +15,22 @@ agents_bp = Blueprint('agents', __name__, url_prefix='/api/agents')
 # Initialize controllers
 accounting_controller = AccountingController()
 
+def get_agent_service():
+    """The AgentService created by create_app"""
+    return current_app.extensions['agent_service']
+
+def get_agent_jobs():
+    """The background job runner created by create_app"""
+    return current_app.extensions['agent_jobs']
+
+def get_n8n_service():
+    """The N8NService created by create_app"""
+    return current_app.extensions['n8n_service']
+
+def get_n8n_dispatcher():
+    """The background webhook dispatcher created by create_app"""
+    return current_app.extensions['n8n_dispatcher']
+
 # API routes
 @api_bp.route('/health', methods=['GET'])
 def health_check():
@@ -23,11 +43,26 @@ def create_transaction():
     """Create accounting transaction"""
     return accounting_controller.create_transaction()
 
+@api_bp.route('/accounting/transactions/bulk', methods=['POST'])
+def create_transactions_bulk():
+    """Create accounting transactions in bulk"""
+    return accounting_controller.create_transactions_bulk()
+
 @api_bp.route('/accounting/transactions', methods=['GET'])
 def list_transactions():
     """List accounting transactions"""
     return accounting_controller.list_transactions()
 
+@api_bp.route('/accounting/transactions/export', methods=['GET'])
+def export_transactions():
+    """Stream accounting transactions as NDJSON or CSV"""
+    return accounting_controller.export_transactions()
+
+@api_bp.route('/accounting/transactions/rollups', methods=['GET'])
+def transaction_rollups():
+    """Daily or monthly transaction totals"""
+    return accounting_controller.transaction_rollups()
+
 # Marketing routes
 @api_bp.route('/marketing/campaigns', methods=['POST'])
 def create_campaign():
@@ -44,11 +79,31 @@ def create_metric():
     """Create ad metric"""
     return accounting_controller.create_metric()
 
+@api_bp.route('/marketing/metrics/bulk', methods=['POST'])
+def create_metrics_bulk():
+    """Create ad metrics in bulk"""
+    return accounting_controller.create_metrics_bulk()
+
 @api_bp.route('/marketing/metrics', methods=['GET'])
 def list_metrics():
     """List ad metrics"""
     return accounting_controller.list_metrics()
 
+@api_bp.route('/marketing/metrics/export', methods=['GET'])
+def export_metrics():
+    """Stream ad metrics as NDJSON or CSV"""
+    return accounting_controller.export_metrics()
+
+@api_bp.route('/marketing/metrics/aggregate', methods=['GET'])
+def aggregate_metrics():
+    """Aggregate ad metrics"""
+    return accounting_controller.aggregate_metrics()
+
+@api_bp.route('/marketing/metrics/rollups', methods=['GET'])
+def metric_rollups():
+    """Daily or monthly metric totals"""
+    return accounting_controller.metric_rollups()
+
 # Analysis routes
 @api_bp.route('/analysis/insights', methods=['POST'])
 def create_insight():
@@ -73,19 +128,210 @@ def list_suggestions():
 # Agents routes
 @api_bp.route('/agents/route', methods=['POST'])
 def run_agent():
-    """Run intelligent agent routing"""
-    from services.agent_service import AgentService
+    """Run intelligent agent routing, or queue it as a job with "async": true"""
+    from services.agent_jobs import JobQueueFull
     
     try:
         data = request.get_json()
         prompt = data.get('prompt', '')
-        params = data.get('params', {})
+        params = data.get('params') or {}
+        
+        agent_service = get_agent_service()
+        error = agent_service.params_error(params)
+        if error:
+            return {"error": error}, 400
+        
+        if data.get('async') or request.args.get('async') in ('1', 'true'):
+            job = get_agent_jobs().submit(prompt, params, agent_service.smart_route(prompt, params))
+            return {"ok": True, "job": job}, 202, {"Location": f"/api/agents/jobs/{job['id']}"}
         
-        agent_service = AgentService()
         result = agent_service.run(prompt, params)
         
         return {"ok": True, "result": result}
         
+    except JobQueueFull as e:
+        return {"error": str(e)}, 503, {"Retry-After": "1"}
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@api_bp.route('/agents/stream', methods=['GET', 'POST'])
+def stream_agent():
+    """Run intelligent agent routing, sending the answer as server-sent events while it is written"""
+    try:
+        if request.method == 'POST':
+            data = request.get_json()
+            prompt = data.get('prompt', '')
+            params = data.get('params') or {}
+            error = get_agent_service().params_error(params)
+            if error:
+                return {"error": error}, 400
+        else:
+            # EventSource can only GET: the prompt and params come from the query string
+            prompt = request.args.get('prompt', '')
+            params = {k: v for k, v in request.args.items() if k != 'prompt'}
+            if 'cache' in params:
+                # Query values are all strings, and "false" would be truthy
+                params['cache'] = params['cache'] in ('1', 'true')
+        
+        events = get_agent_service().stream_events(prompt, params)
+        
+        def sse():
+            try:
+                for event, payload in events:
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+            except Exception as e:
+                yield f"event: error\ndata: {json.dumps({'error': str(e)})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        
+        return Response(sse(), mimetype='text/event-stream', headers={
+            "Cache-Control": "no-cache",
+            # Stop reverse proxies (nginx) from buffering the stream
+            "X-Accel-Buffering": "no"
+        })
+        
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@api_bp.route('/agents/batch', methods=['POST'])
+def run_agent_batch():
+    """Route many prompts at once; results in order, or NDJSON as they finish with "stream": true"""
+    from config.settings import Config
+    
+    try:
+        data = request.get_json()
+        items = data.get('items') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return {"error": "items must be a list of {prompt, params} objects"}, 400
+        if len(items) > Config.AGENT_BATCH_MAX_ITEMS:
+            return {"error": f"At most {Config.AGENT_BATCH_MAX_ITEMS} items per request"}, 413
+        
+        outcomes = get_agent_service().run_batch(items)
+        
+        if data.get('stream') or request.accept_mimetypes.best == 'application/x-ndjson':
+            def ndjson():
+                for index, agent, outcome in outcomes:
+                    yield json.dumps({"index": index, "agent": agent, **outcome}) + '\n'
+            
+            return Response(ndjson(), mimetype='application/x-ndjson')
+        
+        results = [None] * len(items)
+        for index, agent, outcome in outcomes:
+            results[index] = {"index": index, "agent": agent, **outcome}
+        
+        return {"ok": True, "results": results}
+        
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@api_bp.route('/agents/jobs/<job_id>', methods=['GET'])
+def get_agent_job(job_id):
+    """Poll an agent job; ?wait=N long-polls up to N seconds for it to finish"""
+    from config.settings import Config
+    
+    try:
+        try:
+            wait = min(max(float(request.args.get('wait', 0)), 0), Config.AGENT_JOB_MAX_WAIT)
+        except ValueError:
+            return {"error": "wait must be a number of seconds"}, 400
+        
+        job = get_agent_jobs().get(job_id, wait)
+        if job is None:
+            return {"error": "Job not found"}, 404
+        
+        return {"ok": True, "job": job}
+        
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@api_bp.route('/agents/metrics', methods=['GET'])
+def agent_metrics():
+    """Per-agent OpenAI latency/usage, connection reuse and background jobs"""
+    try:
+        return {**get_agent_service().metrics(), "jobs": get_agent_jobs().stats()}
+        
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@api_bp.route('/n8n/webhooks', methods=['POST'])
+def dispatch_webhook():
+    """Queue an N8N webhook call and return at once; delivery happens in the background"""
+    from models.n8n_request import N8NWebhookRequest
+    from services.webhook_dispatcher import DispatchQueueFull
+    
+    try:
+        data = request.get_json()
+        if not isinstance(data, dict) or not all(isinstance(data.get(field) or {}, dict) for field in ('headers', 'body')):
+            return {"error": "Expected a JSON object whose headers and body, if given, are objects"}, 400
+        if not all(isinstance(data.get(field, ''), str) for field in ('webhook_url', 'method')):
+            return {"error": "webhook_url and method, if given, must be strings"}, 400
+
+        webhook = N8NWebhookRequest(
+            webhook_url=data.get('webhook_url', ''),
+            method=data.get('method', 'POST'),
+            headers=data.get('headers'),
+            body=data.get('body')
+        )
+        event = get_n8n_dispatcher().submit(webhook, batch=bool(data.get('batch')))
+        
+        return {"ok": True, **event}, 202
+        
+    except ValueError as e:
+        return {"error": str(e)}, 400
+    except DispatchQueueFull as e:
+        return {"error": str(e)}, 503, {"Retry-After": "1"}
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@api_bp.route('/n8n/workflows/execute', methods=['POST'])
+def execute_workflows():
+    """Execute N8N workflows concurrently; results in item order with per-item timing"""
+    from config.settings import Config
+    from models.n8n_request import N8NWorkflowRequest
+    
+    try:
+        data = request.get_json()
+        items = data.get('items') if isinstance(data, dict) else None
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return {"error": "items must be a list of {workflow_id, payload} objects"}, 400
+        if len(items) > Config.N8N_FANOUT_MAX_ITEMS:
+            return {"error": f"At most {Config.N8N_FANOUT_MAX_ITEMS} items per request"}, 413
+        
+        # Top-level workflow_id/payload apply to items that don't set their own
+        workflows = []
+        for item in items:
+            workflow_id = item.get('workflow_id', data.get('workflow_id', ''))
+            payload = item.get('payload', data.get('payload'))
+            if (not isinstance(workflow_id, str) or not re.fullmatch(r'[A-Za-z0-9_-]+', workflow_id)
+                    or not isinstance(payload or {}, dict)):
+                return {"error": "Each item needs a workflow_id (letters, digits, - or _) and an optional object payload"}, 400
+            workflows.append(N8NWorkflowRequest(workflow_id=workflow_id, payload=payload))
+        
+        try:
+            max_concurrency = min(int(data.get('max_concurrency') or Config.N8N_FANOUT_CONCURRENCY), Config.N8N_FANOUT_CONCURRENCY)
+        except (TypeError, ValueError):
+            return {"error": "max_concurrency must be an integer"}, 400
+        
+        started = time.perf_counter()
+        responses = get_n8n_service().execute_workflows(workflows, max(max_concurrency, 1))
+        
+        return {
+            "ok": True,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 2),
+            "results": [
+                {"index": index, "workflow_id": workflow.workflow_id, **asdict(response)}
+                for index, (workflow, response) in enumerate(zip(workflows, responses))
+            ]
+        }
+        
+    except Exception as e:
+        return {"error": str(e)}, 500
+
+@api_bp.route('/n8n/metrics', methods=['GET'])
+def n8n_metrics():
+    """N8N circuit breaker state, retries, connection reuse and background webhook delivery"""
+    try:
+        return {**get_n8n_service().metrics(), "dispatch": get_n8n_dispatcher().stats()}
+        
     except Exception as e:
         return {"error": str(e)}, 500
 
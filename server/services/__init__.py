@@ -1,3 +1,4 @@
 # Services package
 from .n8n_service import *
 from .agent_service import *
+from .agent_jobs import *
@@ -0,0 +1,101 @@
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional
+from models.agent_job import AgentJob
+from config.settings import Config
+
+# Job states a client can stop polling at
+FINISHED = ('done', 'failed')
+
+class JobQueueFull(Exception):
+    """Every worker is busy and the pending queue is at its limit"""
+
+class AgentJobRunner:
+    """Runs agent prompts on a bounded thread pool and keeps their results for polling
+
+    Jobs live in this process only; with several gunicorn workers, clients
+    must poll the worker that accepted the job (or run a single worker).
+    """
+
+    def __init__(self, run: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+                 workers: Optional[int] = None, max_pending: Optional[int] = None, ttl: Optional[float] = None):
+        self._run = run
+        self.workers = workers or Config.AGENT_JOB_WORKERS
+        self.max_pending = max_pending or Config.AGENT_JOB_MAX_PENDING
+        self.ttl = Config.AGENT_JOB_TTL if ttl is None else ttl
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='agent-job')
+        self._lock = threading.Lock()
+        # Notified whenever a job finishes, waking long-polling readers
+        self._finished = threading.Condition(self._lock)
+        self._jobs = {}
+        # (expiry, job id) in finishing order, so expired results are dropped from the left
+        self._expiry = deque()
+        self._unfinished = 0
+        self.rejected = 0
+
+    def submit(self, prompt: str, params: Dict[str, Any], agent: str) -> Dict[str, Any]:
+        """Queue a prompt and return the new job; raises JobQueueFull when at capacity"""
+        with self._lock:
+            self._purge()
+            if self._unfinished >= self.workers + self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull("Agent job queue is full, retry later")
+
+            job = AgentJob(id=uuid.uuid4().hex, agent=agent, created_at=datetime.now().isoformat())
+            self._jobs[job.id] = job
+            self._unfinished += 1
+            snapshot = asdict(job)
+
+        self._executor.submit(self._execute, job, prompt, params)
+        return snapshot
+
+    def _execute(self, job: AgentJob, prompt: str, params: Dict[str, Any]):
+        with self._lock:
+            job.status = "running"
+            job.started_at = datetime.now().isoformat()
+
+        try:
+            result, error, status = self._run(prompt, params), None, "done"
+        except Exception as e:
+            result, error, status = None, str(e), "failed"
+
+        with self._lock:
+            job.result, job.error, job.status = result, error, status
+            job.finished_at = datetime.now().isoformat()
+            self._unfinished -= 1
+            self._expiry.append((time.monotonic() + self.ttl, job.id))
+            self._finished.notify_all()
+
+    def get(self, job_id: str, wait: float = 0) -> Optional[Dict[str, Any]]:
+        """Current state of a job, waiting up to ``wait`` seconds for it to finish"""
+        with self._lock:
+            self._purge()
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            if wait > 0:
+                self._finished.wait_for(lambda: job.status in FINISHED, timeout=wait)
+            return asdict(job)
+
+    def _purge(self):
+        """Drop finished jobs whose results have outlived the TTL"""
+        now = time.monotonic()
+        while self._expiry and self._expiry[0][0] <= now:
+            self._jobs.pop(self._expiry.popleft()[1], None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._purge()
+            running = sum(1 for job in self._jobs.values() if job.status == "running")
+            return {
+                "workers": self.workers,
+                "running": running,
+                "queued": self._unfinished - running,
+                "retained": len(self._jobs),
+                "rejected": self.rejected
+            }
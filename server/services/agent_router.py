@@ -0,0 +1,86 @@
+import re
+from typing import Dict, Iterable, Optional, Sequence, Tuple
+
+def keyword_pattern(keywords: Iterable[str]) -> re.Pattern:
+    """One regex matching any of ``keywords``, shaped as a trie so shared prefixes are tried once"""
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        ends_here = '' in node
+        body = branches[0] if len(branches) == 1 and not ends_here else '(?:' + '|'.join(branches) + ')'
+        return body + '?' if ends_here else body
+
+    return re.compile(build(trie))
+
+class KeywordRouter:
+    """First-match keyword routing compiled from a table of rules
+
+    ``rules`` are (agent, keywords) pairs in priority order: a prompt goes to
+    the first agent any of whose keywords occurs in it, case-insensitively and
+    anywhere (so "leads" matches "lead").
+
+    Keywords that contain a keyword of the same or a higher-priority rule are
+    dropped, since the shorter one always matches too. Small tables are
+    flattened into one priority-ordered keyword list, where the first keyword
+    found decides; CPython's substring search outruns a single-pass regex
+    there (and a C Aho-Corasick automaton too, on the built-in rules). Tables
+    of ``REGEX_MIN_KEYWORDS`` or more are compiled into a single regex that
+    finds every keyword in one pass over the prompt.
+    """
+
+    # Measured crossover on 10KB prompts is around 80 keywords (tests.bench_router times both)
+    REGEX_MIN_KEYWORDS = 64
+
+    def __init__(self, rules: Sequence[Tuple[str, Iterable[str]]]):
+        self.rules = tuple((agent, tuple(k.lower() for k in keywords if k)) for agent, keywords in rules)
+
+        rank = {}
+        for index, (agent, keywords) in enumerate(self.rules):
+            for keyword in keywords:
+                rank.setdefault(keyword, index)
+        # A keyword containing one of the same or higher priority never decides ("google ads" has "ads")
+        rank = {keyword: index for keyword, index in rank.items()
+                if not any(other != keyword and other in keyword and r <= index for other, r in rank.items())}
+        # (keyword, agent) in priority order; a keyword repeated by a later rule never decides
+        self._keywords = tuple((keyword, self.rules[index][0]) for keyword, index in rank.items())
+
+        self._pattern = None
+        if len(rank) >= self.REGEX_MIN_KEYWORDS:
+            # The regex takes the longest keyword at a position; any shorter keyword
+            # it starts with occurs there too, so a match ranks as its best prefix
+            self._rank = {
+                keyword: min(r for prefix, r in rank.items() if keyword.startswith(prefix))
+                for keyword in rank
+            }
+            self._pattern = keyword_pattern(rank)
+
+    def route(self, prompt: str) -> Optional[str]:
+        """Agent of the highest-priority rule matching ``prompt``, or None"""
+        text = prompt.lower()
+        if self._pattern is None:
+            for keyword, agent in self._keywords:
+                if keyword in text:
+                    return agent
+            return None
+
+        search = self._pattern.search
+        best = len(self.rules)
+        match = search(text)
+        while match:
+            rank = self._rank[match.group()]
+            if rank < best:
+                best = rank
+                if rank == 0:
+                    break
+            # Keywords can overlap ("urlead"), so resume one character in rather than after the match
+            match = search(text, match.start() + 1)
+
+        return self.rules[best][0] if best < len(self.rules) else None
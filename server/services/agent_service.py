@@ -1,14 +1,59 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional, List, Iterator, Tuple
 import requests
 import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime
-from bs4 import BeautifulSoup
 from config.settings import Config
+from .http_client import create_session
+from .agent_router import KeywordRouter
+from .scraper import Crawler, fetch_page
+from .page_cache import create_page_cache
+from .llm_gateway import llm_gateway, LLMError
 
 class AgentService:
-    """Intelligent agent routing service for business operations"""
+    """Intelligent agent routing service for business operations
+
+    Built once per app (``app.extensions['agent_service']``) and shared by
+    every request, so routing tables, the scrape connection pool and the
+    OpenAI gateway are set up at startup instead of per call.
+    """
+    
+    # Prompt keywords of each agent in priority order, unless AGENT_ROUTES overrides them
+    ROUTES = (
+        ('leadgen', ('lead', 'buyer', 'prospect')),
+        ('research', ('research', 'scan', 'find', 'market')),
+        ('scrape', ('scrape', 'url', 'http')),
+        ('enrich', ('enrich', 'score')),
+        ('accounting', ('account', 'invoice', 'transaction')),
+        ('marketing', ('campaign', 'ads', 'meta', 'google ads'))
+    )
+    
+    URL_PATTERN = re.compile(r'https?://\S+')
     
-    def __init__(self):
+    # System prompt and user message template of each agent's OpenAI call
+    LLM_PROMPTS = {
+        'default': ("You are a business intelligence assistant. Provide concise, actionable insights.",
+                    "{}"),
+        'leadgen': ("You are a lead generation expert. Analyze the request and provide strategic insights for finding potential leads.",
+                    "Help me generate leads for: {}"),
+        'research': ("You are a market research expert. Provide comprehensive analysis and insights on the given topic.",
+                     "Research and analyze: {}"),
+        'scrape': ("You are a content analyst. Provide key insights and summary of the given content.",
+                   "Analyze this content and provide key insights: {}"),
+        'enrich': ("You are a data enrichment specialist. Enhance and score the given data with insights.",
+                   "Enrich this data: {}")
+    }
+    
+    # Agents whose answer is a single completion, so it can be streamed while it is written
+    STREAMABLE_AGENTS = ('default', 'leadgen', 'research', 'enrich')
+    
+    def __init__(self, gateway=None, session: Optional[requests.Session] = None,
+                 routes: Optional[List[Tuple[str, Tuple[str, ...]]]] = None):
+        self.gateway = gateway or llm_gateway
+        # Keep-alive connections reused across scrapes of the same sites
+        self.session = session or create_session(Config.SCRAPE_POOL_SIZE)
+        self.page_cache = create_page_cache()
         self.agents = {
             'leadgen': self.run_leadgen,
             'research': self.run_research,
@@ -17,8 +62,30 @@ class AgentService:
             'accounting': self.run_accounting,
             'marketing': self.run_marketing
         }
+        self.router = KeywordRouter(routes or Config.AGENT_ROUTES or self.ROUTES)
+        for agent, _ in self.router.rules:
+            if agent not in self.agents:
+                print(f"Warning: AGENT_ROUTES names unknown agent '{agent}', its prompts go to the default agent")
         self.openai_available = bool(Config.OPENAI_API_KEY and Config.ENABLE_AI_AGENTS)
     
+    def metrics(self) -> Dict[str, Any]:
+        """Per-agent OpenAI latency/usage, connection reuse and scraped page cache hits"""
+        return {
+            **self.gateway.stats(),
+            "page_cache": self.page_cache.stats() if self.page_cache is not None else None
+        }
+    
+    @staticmethod
+    def params_error(params: Any) -> Optional[str]:
+        """Why ``params`` can't be run, or None"""
+        if not isinstance(params, dict):
+            return "params must be an object"
+        if not isinstance(params.get('agent'), (str, type(None))):
+            return "params.agent must be a string"
+        if not isinstance(params.get('cache'), (bool, type(None))):
+            return "params.cache must be true or false"
+        return None
+    
     def smart_route(self, prompt: str, params: Dict[str, Any] = None) -> str:
         """Intelligently route requests to appropriate agents"""
         params = params or {}
@@ -28,32 +95,103 @@ class AgentService:
             return params['agent']
         
         # Route based on prompt content
-        low = prompt.lower()
-        if any(k in low for k in ['lead', 'buyer', 'prospect']):
-            return 'leadgen'
-        if any(k in low for k in ['research', 'scan', 'find', 'market']):
-            return 'research'
-        if any(k in low for k in ['scrape', 'url', 'http']):
-            return 'scrape'
-        if any(k in low for k in ['enrich', 'score']):
-            return 'enrich'
-        if any(k in low for k in ['account', 'invoice', 'transaction']):
-            return 'accounting'
-        if any(k in low for k in ['campaign', 'ads', 'meta', 'google ads']):
-            return 'marketing'
-        
-        return 'default'
+        return self.router.route(prompt) or 'default'
     
     def run(self, prompt: str, params: Dict[str, Any] = None) -> Dict[str, Any]:
         """Run the appropriate agent based on smart routing"""
         params = params or {}
-        agent = self.smart_route(prompt, params)
-        
+        return self._dispatch(self.smart_route(prompt, params), prompt, params)
+    
+    def _dispatch(self, agent: str, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
         if agent in self.agents:
             return self.agents[agent](prompt, params)
         else:
             return self.run_default(prompt, params)
     
+    def _complete(self, agent: str, text: str, params: Dict[str, Any], **options) -> str:
+        system, template = self.LLM_PROMPTS[agent]
+        return self.gateway.complete(agent, system, template.format(text), cache=params.get('cache'), **options)
+    
+    def stream_events(self, prompt: str, params: Dict[str, Any] = None) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Run a prompt as (event, data) pairs: the routed agent, then the answer as it is written
+
+        Agents that can't stream, or run without OpenAI, send their whole result as one event.
+        """
+        params = params or {}
+        error = self.params_error(params)
+        if error:
+            yield 'error', {"error": error}
+            return
+        agent = self.smart_route(prompt, params)
+        agent = agent if agent in self.agents else 'default'
+        yield 'agent', {"agent": agent}
+        
+        if agent not in self.STREAMABLE_AGENTS or not self.openai_available:
+            yield 'result', self._dispatch(agent, prompt, params)
+            return
+        
+        text = params.get('topic') or prompt if agent == 'research' else prompt
+        system, template = self.LLM_PROMPTS[agent]
+        try:
+            for piece in self.gateway.stream(agent, system, template.format(text), cache=params.get('cache')):
+                yield 'token', {"text": piece}
+        except LLMError as e:
+            yield 'error', {"error": str(e)}
+        except Exception as e:
+            yield 'error', {"error": f"OpenAI integration error: {str(e)}"}
+    
+    def run_batch(self, items: List[Dict[str, Any]], limits: Optional[Dict[str, int]] = None,
+                  workers: Optional[int] = None) -> Iterator[Tuple[int, str, Dict[str, Any]]]:
+        """Route and run many prompts concurrently, yielding (index, agent, outcome) as each finishes
+
+        At most ``limits[agent]`` prompts of one agent run at once, so a slow
+        agent can't take every worker; an outcome is {"result": ...} or {"error": ...}.
+        """
+        limits = limits or Config.AGENT_BATCH_LIMITS
+        workers = workers or Config.AGENT_BATCH_WORKERS
+        
+        queues, running, unroutable = {}, {}, []
+        for index, item in enumerate(items):
+            prompt, params = item.get('prompt', ''), item.get('params') or {}
+            if not isinstance(prompt, str) or self.params_error(params):
+                unroutable.append(index)
+                continue
+            agent = self.smart_route(prompt, params)
+            agent = agent if agent in self.agents else 'default'
+            queues.setdefault(agent, deque()).append((index, prompt, params))
+            running[agent] = 0
+        
+        for index in unroutable:
+            yield index, None, {"error": "prompt must be a string and params an object whose agent, if given, "
+                                         "is a string and cache true or false"}
+        
+        def outcome(agent: str, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                return {"result": self._dispatch(agent, prompt, params)}
+            except Exception as e:
+                return {"error": str(e)}
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='agent-batch') as pool:
+            futures = {}
+            
+            def fill():
+                # Start queued prompts while their agent is under its limit and a worker is free
+                for agent, queue in queues.items():
+                    limit = limits.get(agent, Config.AGENT_BATCH_DEFAULT_LIMIT)
+                    while queue and running[agent] < limit and len(futures) < workers:
+                        index, prompt, params = queue.popleft()
+                        futures[pool.submit(outcome, agent, prompt, params)] = (index, agent)
+                        running[agent] += 1
+            
+            fill()
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index, agent = futures.pop(future)
+                    running[agent] -= 1
+                    yield index, agent, future.result()
+                fill()
+    
     def run_default(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Default agent for unrecognized requests"""
         if self.openai_available:
@@ -69,48 +207,24 @@ class AgentService:
     def _enhance_with_openai(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Enhance response using OpenAI API"""
         try:
-            headers = {
-                "Authorization": f"Bearer {Config.OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
+            ai_response = self._complete('default', prompt, params)
             
-            data = {
-                "model": Config.OPENAI_MODEL,
-                "messages": [
-                    {"role": "system", "content": "You are a business intelligence assistant. Provide concise, actionable insights."},
-                    {"role": "user", "content": prompt}
-                ],
-                "max_tokens": Config.OPENAI_MAX_TOKENS,
-                "temperature": Config.OPENAI_TEMPERATURE
+            return {
+                "echo": prompt,
+                "agent": "default",
+                "ai_enhanced": True,
+                "response": ai_response,
+                "timestamp": datetime.now().isoformat()
             }
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_response = result['choices'][0]['message']['content']
-                
-                return {
-                    "echo": prompt,
-                    "agent": "default",
-                    "ai_enhanced": True,
-                    "response": ai_response,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return {
-                    "echo": prompt,
-                    "agent": "default",
-                    "ai_enhanced": False,
-                    "error": f"OpenAI API error: {response.status_code}",
-                    "timestamp": datetime.now().isoformat()
-                }
-                
+        except LLMError as e:
+            return {
+                "echo": prompt,
+                "agent": "default",
+                "ai_enhanced": False,
+                "error": str(e),
+                "timestamp": datetime.now().isoformat()
+            }
         except Exception as e:
             return {
                 "echo": prompt,
@@ -123,7 +237,9 @@ class AgentService:
     def run_leadgen(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Lead generation agent"""
         if self.openai_available:
-            return self._enhance_leadgen_with_openai(prompt, params)
+            enhanced = self._enhance_leadgen_with_openai(prompt, params)
+            if enhanced:
+                return enhanced
         
         return {
             "items": [
@@ -139,61 +255,37 @@ class AgentService:
             "note": "OpenAI integration not available"
         }
     
-    def _enhance_leadgen_with_openai(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Enhance lead generation with OpenAI insights"""
+    def _enhance_leadgen_with_openai(self, prompt: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Enhance lead generation with OpenAI insights, or None to fall back to the basic version"""
         try:
-            headers = {
-                "Authorization": f"Bearer {Config.OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
+            ai_insights = self._complete('leadgen', prompt, params)
             
-            data = {
-                "model": Config.OPENAI_MODEL,
-                "messages": [
-                    {"role": "system", "content": "You are a lead generation expert. Analyze the request and provide strategic insights for finding potential leads."},
-                    {"role": "user", "content": f"Help me generate leads for: {prompt}"}
+            return {
+                "items": [
+                    {
+                        "name": "AI-Enhanced Lead Strategy",
+                        "platform": "multi-platform",
+                        "score": 0.9,
+                        "source": prompt,
+                        "ai_insights": ai_insights
+                    }
                 ],
-                "max_tokens": Config.OPENAI_MAX_TOKENS,
-                "temperature": Config.OPENAI_TEMPERATURE
+                "agent": "leadgen",
+                "ai_enhanced": True,
+                "timestamp": datetime.now().isoformat()
             }
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_insights = result['choices'][0]['message']['content']
-                
-                return {
-                    "items": [
-                        {
-                            "name": "AI-Enhanced Lead Strategy",
-                            "platform": "multi-platform",
-                            "score": 0.9,
-                            "source": prompt,
-                            "ai_insights": ai_insights
-                        }
-                    ],
-                    "agent": "leadgen",
-                    "ai_enhanced": True,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return self.run_leadgen(prompt, params)  # Fallback to basic version
-                
-        except Exception as e:
-            return self.run_leadgen(prompt, params)  # Fallback to basic version
+        except Exception:
+            return None
     
     def run_research(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Market research agent"""
         topic = params.get('topic') or prompt
         
         if self.openai_available:
-            return self._enhance_research_with_openai(topic, params)
+            enhanced = self._enhance_research_with_openai(topic, params)
+            if enhanced:
+                return enhanced
         
         return {
             "summary": f"Desk research on: {topic}",
@@ -203,51 +295,30 @@ class AgentService:
             "note": "OpenAI integration not available"
         }
     
-    def _enhance_research_with_openai(self, topic: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Enhance research with OpenAI analysis"""
+    def _enhance_research_with_openai(self, topic: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Enhance research with OpenAI analysis, or None to fall back to the basic version"""
         try:
-            headers = {
-                "Authorization": f"Bearer {Config.OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
+            ai_analysis = self._complete('research', topic, params)
             
-            data = {
-                "model": Config.OPENAI_MODEL,
-                "messages": [
-                    {"role": "system", "content": "You are a market research expert. Provide comprehensive analysis and insights on the given topic."},
-                    {"role": "user", "content": f"Research and analyze: {topic}"}
-                ],
-                "max_tokens": Config.OPENAI_MAX_TOKENS,
-                "temperature": Config.OPENAI_TEMPERATURE
+            return {
+                "summary": f"AI-enhanced research on: {topic}",
+                "agent": "research",
+                "topic": topic,
+                "ai_analysis": ai_analysis,
+                "ai_enhanced": True,
+                "timestamp": datetime.now().isoformat()
             }
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_analysis = result['choices'][0]['message']['content']
-                
-                return {
-                    "summary": f"AI-enhanced research on: {topic}",
-                    "agent": "research",
-                    "topic": topic,
-                    "ai_analysis": ai_analysis,
-                    "ai_enhanced": True,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return self.run_research(topic, params)  # Fallback to basic version
-                
-        except Exception as e:
-            return self.run_research(topic, params)  # Fallback to basic version
+        except Exception:
+            return None
     
     def run_scrape(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Web scraping agent with BeautifulSoup"""
+        """Web scraping agent with BeautifulSoup
+
+        Several URLs (``params.urls`` or more than one in the prompt) or a
+        ``params.depth`` above 0 switch to crawl mode, which fetches the pages
+        concurrently and returns each one's extract.
+        """
         if not Config.ENABLE_WEB_SCRAPING:
             return {
                 "error": "Web scraping is disabled",
@@ -255,9 +326,9 @@ class AgentService:
                 "prompt": prompt
             }
         
-        url = params.get("url") or (re.search(r'https?://\S+', prompt).group(0) if re.search(r'https?://\S+', prompt) else None)
+        urls = params.get("urls") or ([params["url"]] if params.get("url") else self.URL_PATTERN.findall(prompt))
         
-        if not url:
+        if not urls:
             return {
                 "error": "No URL detected",
                 "agent": "scrape",
@@ -265,36 +336,27 @@ class AgentService:
             }
         
         try:
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-
-            # Use BeautifulSoup for better content extraction
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # Extract title
-            title = soup.title.string if soup.title else ""
-
-            # Extract meaningful text content
-            text_elements = soup.find_all(['p', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
-            text = " ".join([elem.get_text(' ', strip=True) for elem in text_elements if elem.get_text(strip=True)])[:2000]
-
-            # Extract meta description if available
-            meta_desc = soup.find('meta', attrs={'name': 'description'})
-            description = meta_desc.get('content', '') if meta_desc else ""
-
-            result = {
-                "url": url,
-                "title": title,
-                "description": description,
-                "extract": text,
+            depth = int(params.get("depth") or 0)
+        except (TypeError, ValueError):
+            depth = -1
+        if not isinstance(urls, list) or not all(isinstance(url, str) for url in urls) or depth < 0:
+            return {
+                "error": "urls must be a list of strings and depth a non-negative integer",
                 "agent": "scrape",
-                "status": "success",
-                "content_length": len(response.text)
+                "prompt": prompt
             }
+        
+        if len(urls) > 1 or depth > 0:
+            return self._crawl(urls, min(depth, Config.SCRAPE_CRAWL_MAX_DEPTH))
+        
+        url = urls[0]
+        try:
+            page, _ = fetch_page(self.session, url, cache=self.page_cache)
+            result = {**page, "agent": "scrape", "status": "success"}
             
             # Enhance with OpenAI if available
             if self.openai_available:
-                result.update(self._enhance_scraping_with_openai(text, params))
+                result.update(self._enhance_scraping_with_openai(page["extract"], params))
             
             return result
             
@@ -306,52 +368,45 @@ class AgentService:
                 "url": url
             }
     
+    def _crawl(self, urls: List[str], depth: int) -> Dict[str, Any]:
+        """Crawl mode of the scrape agent: every page's extract, without OpenAI analysis"""
+        pages = Crawler(self.session, cache=self.page_cache).crawl(urls, depth)
+        failed = sum(1 for page in pages if page["status"] != "success")
+        
+        return {
+            "agent": "scrape",
+            "mode": "crawl",
+            "status": "success" if failed < len(pages) else "error",
+            "depth": depth,
+            "page_count": len(pages),
+            "failed": failed,
+            "pages": pages,
+            "timestamp": datetime.now().isoformat()
+        }
+    
     def _enhance_scraping_with_openai(self, content: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Enhance scraped content with OpenAI analysis"""
         try:
-            headers = {
-                "Authorization": f"Bearer {Config.OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
             # Truncate content to fit within token limits
             truncated_content = content[:1500]  # Leave room for prompt and response
             
-            data = {
-                "model": Config.OPENAI_MODEL,
-                "messages": [
-                    {"role": "system", "content": "You are a content analyst. Provide key insights and summary of the given content."},
-                    {"role": "user", "content": f"Analyze this content and provide key insights: {truncated_content}"}
-                ],
-                "max_tokens": min(Config.OPENAI_MAX_TOKENS, 500),  # Shorter response for content analysis
-                "temperature": Config.OPENAI_TEMPERATURE
-            }
+            # Shorter response for content analysis
+            ai_insights = self._complete('scrape', truncated_content, params, max_tokens=500)
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
+            return {
+                "ai_enhanced": True,
+                "ai_insights": ai_insights
+            }
             
-            if response.status_code == 200:
-                result = response.json()
-                ai_insights = result['choices'][0]['message']['content']
-                
-                return {
-                    "ai_enhanced": True,
-                    "ai_insights": ai_insights
-                }
-            else:
-                return {"ai_enhanced": False}
-                
-        except Exception as e:
+        except Exception:
             return {"ai_enhanced": False}
     
     def run_enrich(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Data enrichment agent"""
         if self.openai_available:
-            return self._enhance_enrichment_with_openai(prompt, params)
+            enhanced = self._enhance_enrichment_with_openai(prompt, params)
+            if enhanced:
+                return enhanced
         
         return {
             "enriched_data": {
@@ -364,51 +419,25 @@ class AgentService:
             "note": "OpenAI integration not available"
         }
     
-    def _enhance_enrichment_with_openai(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
-        """Enhance data enrichment with OpenAI"""
+    def _enhance_enrichment_with_openai(self, prompt: str, params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Enhance data enrichment with OpenAI, or None to fall back to the basic version"""
         try:
-            headers = {
-                "Authorization": f"Bearer {Config.OPENAI_API_KEY}",
-                "Content-Type": "application/json"
-            }
+            ai_enrichment = self._complete('enrich', prompt, params)
             
-            data = {
-                "model": Config.OPENAI_MODEL,
-                "messages": [
-                    {"role": "system", "content": "You are a data enrichment specialist. Enhance and score the given data with insights."},
-                    {"role": "user", "content": f"Enrich this data: {prompt}"}
-                ],
-                "max_tokens": Config.OPENAI_MAX_TOKENS,
-                "temperature": Config.OPENAI_TEMPERATURE
+            return {
+                "enriched_data": {
+                    "original": prompt,
+                    "ai_enhanced": ai_enrichment,
+                    "score": 0.9,
+                    "confidence": "high"
+                },
+                "agent": "enrich",
+                "ai_enhanced": True,
+                "timestamp": datetime.now().isoformat()
             }
             
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                ai_enrichment = result['choices'][0]['message']['content']
-                
-                return {
-                    "enriched_data": {
-                        "original": prompt,
-                        "ai_enhanced": ai_enrichment,
-                        "score": 0.9,
-                        "confidence": "high"
-                    },
-                    "agent": "enrich",
-                    "ai_enhanced": True,
-                    "timestamp": datetime.now().isoformat()
-                }
-            else:
-                return self.run_enrich(prompt, params)  # Fallback to basic version
-                
-        except Exception as e:
-            return self.run_enrich(prompt, params)  # Fallback to basic version
+        except Exception:
+            return None
     
     def run_accounting(self, prompt: str, params: Dict[str, Any]) -> Dict[str, Any]:
         """Accounting agent"""
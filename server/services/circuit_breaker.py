@@ -0,0 +1,76 @@
+import threading
+import time
+from typing import Dict, Any
+
+class CircuitBreaker:
+    """Fails calls fast while a dependency keeps failing
+
+    Closed: calls go through, and ``failure_threshold`` consecutive failures
+    open the circuit. Open: calls are refused until ``reset_timeout`` seconds
+    have passed. Half-open: one trial call goes through; its success closes
+    the circuit again and its failure re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_running = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; every allowed call must be followed by record()"""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            if self._state == self.CLOSED or (self._state == self.HALF_OPEN and not self._trial_running):
+                self._trial_running = self._state == self.HALF_OPEN
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool):
+        with self._lock:
+            self._trial_running = False
+            if success:
+                self._state = self.CLOSED
+                self._failures = 0
+                return
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self.times_opened += 1
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def retry_after(self) -> float:
+        """Seconds until an open circuit lets a trial call through"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        retry_after = self.retry_after()
+        with self._lock:
+            state = self._state
+            if state == self.OPEN and retry_after == 0:
+                # Due for a trial call, which the next allow() will admit
+                state = self.HALF_OPEN
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_timeout_seconds": self.reset_timeout,
+                "retry_after_seconds": round(retry_after, 2),
+                "times_opened": self.times_opened,
+                "rejected": self.rejected
+            }
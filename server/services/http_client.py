@@ -0,0 +1,35 @@
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any
+
+def create_session(pool_size: int = 10) -> requests.Session:
+    """Keep-alive HTTP session holding up to ``pool_size`` open connections per host"""
+    session = requests.Session()
+    # pool_block=False: a burst beyond the pool opens extra connections instead of waiting
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=False)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def connection_stats(session: requests.Session) -> Dict[str, Any]:
+    """Connections opened versus requests sent through a session's pools"""
+    hosts = {}
+    for adapter in {id(a): a for a in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            host = f"{pool.scheme}://{pool.host}:{pool.port}"
+            hosts[host] = {
+                "connections": pool.num_connections,
+                "requests": pool.num_requests,
+                "reused": pool.num_requests - pool.num_connections
+            }
+
+    return {
+        "connections": sum(h["connections"] for h in hosts.values()),
+        "requests": sum(h["requests"] for h in hosts.values()),
+        "reused": sum(h["reused"] for h in hosts.values()),
+        "hosts": hosts
+    }
@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from config.settings import Config
+
+def cache_key(agent: str, model: str, temperature: float, prompt: str) -> str:
+    """Key of a completion; prompts differing only in case or whitespace share it"""
+    normalized = " ".join(prompt.split()).casefold()
+    raw = json.dumps([agent, model, temperature, normalized], ensure_ascii=False)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+class LLMCache:
+    """Hit/miss accounting shared by the cache backends"""
+
+    backend = None
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._counter_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        value = self._get(key)
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                "backend": self.backend,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "ttl_seconds": self.ttl
+            }
+
+class MemoryLLMCache(LLMCache):
+    """Per-process LRU of completions, each kept for at most ``ttl`` seconds"""
+
+    backend = 'memory'
+
+    def __init__(self, max_entries: int, ttl: float):
+        super().__init__(ttl)
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._lock:
+            stats.update(entries=len(self._entries), max_entries=self.max_entries, evictions=self.evictions)
+        return stats
+
+class RedisLLMCache(LLMCache):
+    """Completions shared by all workers through Redis; size is bounded by Redis' maxmemory policy"""
+
+    backend = 'redis'
+    PREFIX = 'egy:llm:'
+
+    def __init__(self, client, ttl: float):
+        super().__init__(ttl)
+        self.client = client
+
+    def _get(self, key: str) -> Optional[str]:
+        try:
+            value = self.client.get(self.PREFIX + key)
+        except Exception as e:
+            # An unreachable cache must not take the agents down with it
+            print(f"Warning: LLM cache read failed: {e}")
+            return None
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str):
+        try:
+            self.client.set(self.PREFIX + key, value.encode(), ex=max(1, int(self.ttl)))
+        except Exception as e:
+            print(f"Warning: LLM cache write failed: {e}")
+
+def create_llm_cache(backend: str = None) -> Optional[LLMCache]:
+    """Build the completion cache described by LLM_CACHE_BACKEND, or None when disabled"""
+    backend = (backend or Config.LLM_CACHE_BACKEND).lower()
+    if backend in ('', 'none', 'off'):
+        return None
+
+    if backend == 'redis':
+        try:
+            import redis
+            return RedisLLMCache(redis.Redis.from_url(Config.REDIS_URL), Config.LLM_CACHE_TTL)
+        except ImportError:
+            print("Warning: redis package not installed, using in-memory LLM cache")
+
+    elif backend != 'memory':
+        print(f"Warning: Unsupported LLM_CACHE_BACKEND '{backend}', using in-memory LLM cache")
+
+    return MemoryLLMCache(Config.LLM_CACHE_SIZE, Config.LLM_CACHE_TTL)
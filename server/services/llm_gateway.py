@@ -0,0 +1,256 @@
+import json
+import threading
+import time
+import requests
+from concurrent.futures import Future
+from typing import Dict, Any, Iterator, Optional
+from config.settings import Config
+from .http_client import create_session, connection_stats
+from .llm_cache import LLMCache, cache_key, create_llm_cache
+
+# Upstream answers worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Longest Retry-After the gateway will honour before giving up on a retry, in seconds
+MAX_RETRY_DELAY = 10
+
+class LLMError(Exception):
+    """OpenAI answered, but not with a usable completion"""
+
+class LLMGateway:
+    """Single path from the agents to the OpenAI chat completions API
+
+    Identical requests already in flight share one upstream call, at most
+    ``max_concurrency`` calls run at once, ``max_tokens`` never exceeds the
+    configured budget, and latency/usage is counted per agent. Deterministic
+    (temperature 0) or explicitly opted-in completions are served from a cache.
+    """
+
+    def __init__(self, session: Optional[requests.Session] = None, base_url: Optional[str] = None,
+                 max_concurrency: Optional[int] = None, max_retries: Optional[int] = None,
+                 cache: Optional[LLMCache] = None):
+        self.session = session or create_session(Config.OPENAI_POOL_SIZE)
+        self.cache = cache if cache is not None else create_llm_cache()
+        self.base_url = base_url or Config.OPENAI_BASE_URL
+        self.max_retries = Config.OPENAI_MAX_RETRIES if max_retries is None else max_retries
+        # Defaults to the pool size so a burst queues here instead of opening throwaway connections
+        self._slots = threading.BoundedSemaphore(max_concurrency or Config.OPENAI_MAX_CONCURRENCY)
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._stats = {}
+
+    def complete(self, agent: str, system: str, prompt: str, max_tokens: Optional[int] = None,
+                 temperature: Optional[float] = None, cache: Optional[bool] = None) -> str:
+        """Chat completion text for one system/user prompt pair
+
+        ``cache`` forces the response cache on or off; by default only
+        temperature 0 completions, which are repeatable, are cached.
+        """
+        data = self._payload(system, prompt, max_tokens, temperature)
+
+        started = time.perf_counter()
+        key = self._cache_key(agent, data, prompt, cache)
+        if key is not None:
+            content = self.cache.get(key)
+            if content is not None:
+                self._count(agent, started, cache_hits=1)
+                return content
+
+        try:
+            content = self._coalesced(agent, data)['choices'][0]['message']['content']
+        except Exception:
+            self._count(agent, started, errors=1)
+            raise
+
+        if key is not None:
+            self.cache.set(key, content)
+        self._count(agent, started)
+        return content
+
+    def stream(self, agent: str, system: str, prompt: str, max_tokens: Optional[int] = None,
+               temperature: Optional[float] = None, cache: Optional[bool] = None) -> Iterator[str]:
+        """Yield a completion's text in pieces as the model produces them
+
+        Holds one concurrency slot until the stream ends or the consumer stops
+        reading. A cached completion is yielded whole.
+        """
+        data = self._payload(system, prompt, max_tokens, temperature)
+
+        started = time.perf_counter()
+        key = self._cache_key(agent, data, prompt, cache)
+        if key is not None:
+            content = self.cache.get(key)
+            if content is not None:
+                self._count(agent, started, cache_hits=1)
+                yield content
+                return
+
+        data.update(stream=True, stream_options={"include_usage": True})
+        parts = []
+        try:
+            with self._slots, self._send(agent, data, stream=True) as response:
+                for line in response.iter_lines():
+                    # Server-sent events: "data: {json}" lines, ending with "data: [DONE]"
+                    if not line.startswith(b'data:'):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == b'[DONE]':
+                        break
+
+                    chunk = json.loads(payload)
+                    usage = chunk.get('usage')
+                    if usage:
+                        self._count(agent, prompt_tokens=usage.get('prompt_tokens', 0),
+                                    completion_tokens=usage.get('completion_tokens', 0))
+                    choices = chunk.get('choices') or []
+                    text = choices[0].get('delta', {}).get('content') if choices else None
+                    if text:
+                        if not parts:
+                            self._count(agent, streams=1,
+                                        total_first_token_ms=(time.perf_counter() - started) * 1000)
+                        parts.append(text)
+                        yield text
+        except GeneratorExit:
+            # The consumer went away; the partial text is neither an error nor cacheable
+            self._count(agent, started)
+            raise
+        except Exception:
+            self._count(agent, started, errors=1)
+            raise
+
+        if key is not None:
+            self.cache.set(key, ''.join(parts))
+        self._count(agent, started)
+
+    def _payload(self, system: str, prompt: str, max_tokens: Optional[int],
+                 temperature: Optional[float]) -> Dict[str, Any]:
+        return {
+            "model": Config.OPENAI_MODEL,
+            "messages": [
+                {"role": "system", "content": system},
+                {"role": "user", "content": prompt}
+            ],
+            "max_tokens": min(max_tokens or Config.OPENAI_MAX_TOKENS, Config.OPENAI_MAX_TOKENS),
+            "temperature": Config.OPENAI_TEMPERATURE if temperature is None else temperature
+        }
+
+    def _cache_key(self, agent: str, data: Dict[str, Any], prompt: str, cache: Optional[bool]) -> Optional[str]:
+        """Cache key of a request, or None when it must not be cached"""
+        if self.cache is None or not (data['temperature'] == 0 if cache is None else cache):
+            return None
+        return cache_key(agent, data['model'], data['temperature'], prompt)
+
+    def _coalesced(self, agent: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a request, or wait for the identical one already in flight"""
+        key = (data['model'], data['max_tokens'], data['temperature'],
+               tuple((m['role'], m['content']) for m in data['messages']))
+
+        with self._lock:
+            pending = self._inflight.get(key)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[key] = Future()
+
+        if not leader:
+            self._count(agent, coalesced=1)
+            return pending.result()
+
+        try:
+            pending.set_result(self._post(agent, data))
+        except Exception as e:
+            pending.set_exception(e)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return pending.result()
+
+    def _post(self, agent: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Completion response body of a non-streaming request"""
+        with self._slots, self._send(agent, data) as response:
+            result = response.json()
+        # Usage is billed per upstream call, so coalesced waiters add none
+        usage = result.get('usage') or {}
+        self._count(agent, prompt_tokens=usage.get('prompt_tokens', 0),
+                    completion_tokens=usage.get('completion_tokens', 0))
+        return result
+
+    def _send(self, agent: str, data: Dict[str, Any], stream: bool = False) -> requests.Response:
+        """POST a completion request, retrying rate limits, server errors and failed connects"""
+        headers = {
+            "Authorization": f"Bearer {Config.OPENAI_API_KEY}",
+            "Content-Type": "application/json"
+        }
+
+        attempt = 0
+        while True:
+            self._count(agent, upstream_calls=1)
+            try:
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    headers=headers,
+                    json=data,
+                    stream=stream,
+                    timeout=(Config.OPENAI_CONNECT_TIMEOUT, Config.OPENAI_READ_TIMEOUT)
+                )
+            except requests.exceptions.ConnectionError:
+                # Nothing reached the API; a read timeout is not retried as it may have been processed
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+
+            if response is not None:
+                if response.status_code == 200:
+                    return response
+                response.close()
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    raise LLMError(f"OpenAI API error: {response.status_code}")
+
+            delay = Config.OPENAI_RETRY_BACKOFF * 2 ** attempt
+            retry_after = response.headers.get('Retry-After') if response is not None else None
+            if retry_after:
+                try:
+                    delay = max(delay, float(retry_after))
+                except ValueError:
+                    pass
+                if delay > MAX_RETRY_DELAY:
+                    raise LLMError(f"OpenAI API error: {response.status_code}")
+
+            attempt += 1
+            self._count(agent, retries=1)
+            time.sleep(delay)
+
+    def _count(self, agent: str, started: Optional[float] = None, **counters):
+        with self._lock:
+            stats = self._stats.get(agent)
+            if stats is None:
+                stats = self._stats[agent] = {
+                    "requests": 0, "upstream_calls": 0, "cache_hits": 0, "coalesced": 0, "retries": 0, "errors": 0,
+                    "prompt_tokens": 0, "completion_tokens": 0, "total_latency_ms": 0.0, "max_latency_ms": 0.0,
+                    "streams": 0, "total_first_token_ms": 0.0
+                }
+            for name, value in counters.items():
+                stats[name] += value
+            if started is not None:
+                elapsed = (time.perf_counter() - started) * 1000
+                stats["requests"] += 1
+                stats["total_latency_ms"] += elapsed
+                stats["max_latency_ms"] = max(stats["max_latency_ms"], elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-agent counters, cache hit rate and connection reuse of the shared session"""
+        with self._lock:
+            agents = {agent: dict(stats) for agent, stats in self._stats.items()}
+        for stats in agents.values():
+            stats["avg_latency_ms"] = round(stats["total_latency_ms"] / stats["requests"], 2) if stats["requests"] else None
+            stats["total_latency_ms"] = round(stats["total_latency_ms"], 2)
+            stats["max_latency_ms"] = round(stats["max_latency_ms"], 2)
+            first_token_ms = stats.pop("total_first_token_ms")
+            stats["avg_first_token_ms"] = round(first_token_ms / stats["streams"], 2) if stats["streams"] else None
+        return {
+            "agents": agents,
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "http": connection_stats(self.session)
+        }
+
+# Shared by every AgentService so agents pool connections and concurrency limits
+llm_gateway = LLMGateway()
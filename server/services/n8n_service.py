@@ -1,16 +1,50 @@
+import random
+import threading
+import time
 import requests
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional
+from urllib3.exceptions import NewConnectionError
 from models.n8n_request import N8NWebhookRequest, N8NWorkflowRequest, N8NResponse
 from config.settings import Config
+from .http_client import create_session, connection_stats
+from .circuit_breaker import CircuitBreaker
+
+# Methods safe to send twice, so timeouts and 5xx answers may be retried
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS')
+
+# Upstream answers worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Longest backoff between two attempts, in seconds
+MAX_RETRY_DELAY = 8
+
+def _never_sent(error: requests.exceptions.RequestException) -> bool:
+    """Whether a failed request never reached n8n, so retrying it can't run anything twice"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(reason, NewConnectionError)
 
 class N8NService:
-    """Service for executing N8N workflows and webhooks"""
+    """Service for executing N8N workflows and webhooks
     
-    def __init__(self):
+    Calls share one keep-alive session. Failed connects are retried for every
+    call and timeouts/5xx answers for idempotent ones, with jittered
+    exponential backoff. A circuit breaker answers at once, without calling
+    n8n, after N8N_BREAKER_FAILURES consecutive failures.
+    """
+    
+    def __init__(self, session: Optional[requests.Session] = None, breaker: Optional[CircuitBreaker] = None):
         self.base_url = Config.N8N_BASE_URL
         self.api_key = Config.N8N_API_KEY
         self.timeout = Config.N8N_TIMEOUT_SECONDS
         self.webhook_url = Config.N8N_WEBHOOK_URL
+        self.max_retries = Config.N8N_MAX_RETRIES
+        self.session = session or create_session(Config.N8N_POOL_SIZE)
+        self.breaker = breaker or CircuitBreaker(Config.N8N_BREAKER_FAILURES, Config.N8N_BREAKER_RESET_SECONDS)
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "upstream_calls": 0, "retries": 0, "errors": 0, "fast_failed": 0}
     
     def execute_webhook(self, request: N8NWebhookRequest) -> N8NResponse:
         """Execute a webhook request to N8N"""
@@ -21,27 +55,14 @@ class N8NService:
                 body={"error": "N8N workflows are disabled"}
             )
         
-        try:
-            response = requests.request(
-                method=request.method,
-                url=request.webhook_url or self.webhook_url,
-                headers=request.headers or {},
-                json=request.body or {},
-                timeout=self.timeout
-            )
-            
-            return N8NResponse(
-                success=response.status_code < 400,
-                status_code=response.status_code,
-                body=response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
-            )
-            
-        except requests.exceptions.RequestException as e:
-            return N8NResponse(
-                success=False,
-                status_code=0,
-                body={"error": str(e)}
-            )
+        method = request.method.upper()
+        return self._request(
+            method,
+            request.webhook_url or self.webhook_url,
+            idempotent=method in IDEMPOTENT_METHODS,
+            headers=request.headers or {},
+            json=request.body or {}
+        )
     
     def execute_workflow(self, request: N8NWorkflowRequest) -> N8NResponse:
         """Execute a workflow via N8N REST API"""
@@ -59,39 +80,45 @@ class N8NService:
                 body={"error": "N8N API key not configured"}
             )
         
-        try:
-            # Build the API URL
-            base_url = request.base_url or self.base_url
-            api_url = f"{base_url}/api/v1/workflows/{request.workflow_id}/execute"
-            
-            headers = {
-                "Content-Type": "application/json"
-            }
-            
-            # Use request API key if provided, otherwise use config
-            api_key = request.api_key or self.api_key
-            if api_key:
-                headers["X-N8N-API-Key"] = api_key
-            
-            response = requests.post(
-                url=api_url,
-                headers=headers,
-                json=request.payload or {},
-                timeout=self.timeout
-            )
-            
-            return N8NResponse(
-                success=response.status_code < 400,
-                status_code=response.status_code,
-                body=response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
-            )
-            
-        except requests.exceptions.RequestException as e:
-            return N8NResponse(
-                success=False,
-                status_code=0,
-                body={"error": str(e)}
-            )
+        # Build the API URL
+        base_url = request.base_url or self.base_url
+        api_url = f"{base_url}/api/v1/workflows/{request.workflow_id}/execute"
+        
+        headers = {
+            "Content-Type": "application/json"
+        }
+        
+        # Use request API key if provided, otherwise use config
+        api_key = request.api_key or self.api_key
+        if api_key:
+            headers["X-N8N-API-Key"] = api_key
+        
+        # Executing twice would run the workflow twice, so only failed connects are retried
+        return self._request('POST', api_url, idempotent=False, headers=headers, json=request.payload or {})
+    
+    def execute_workflows(self, workflow_requests: List[N8NWorkflowRequest], max_concurrency: Optional[int] = None) -> List[N8NResponse]:
+        """Execute many workflows concurrently, returning their responses in request order
+
+        At most ``max_concurrency`` (N8N_FANOUT_CONCURRENCY by default) run at
+        once; each response carries its own ``elapsed_ms``.
+        """
+        workers = min(max_concurrency or Config.N8N_FANOUT_CONCURRENCY, len(workflow_requests))
+        
+        def execute(request: N8NWorkflowRequest) -> N8NResponse:
+            try:
+                return self.execute_workflow(request)
+            except Exception as e:
+                return N8NResponse(
+                    success=False,
+                    status_code=0,
+                    body={"error": str(e)}
+                )
+        
+        if workers <= 1:
+            return [execute(request) for request in workflow_requests]
+        
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='n8n-fanout') as pool:
+            return list(pool.map(execute, workflow_requests))
     
     def get_workflow_status(self, workflow_id: str) -> N8NResponse:
         """Get the status of a specific workflow"""
@@ -109,28 +136,78 @@ class N8NService:
                 body={"error": "N8N API key not configured"}
             )
         
-        try:
-            api_url = f"{self.base_url}/api/v1/workflows/{workflow_id}"
-            
-            headers = {
-                "X-N8N-API-Key": self.api_key
-            }
-            
-            response = requests.get(
-                url=api_url,
-                headers=headers,
-                timeout=self.timeout
-            )
-            
-            return N8NResponse(
-                success=response.status_code < 400,
-                status_code=response.status_code,
-                body=response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
-            )
-            
-        except requests.exceptions.RequestException as e:
+        api_url = f"{self.base_url}/api/v1/workflows/{workflow_id}"
+        
+        headers = {
+            "X-N8N-API-Key": self.api_key
+        }
+        
+        return self._request('GET', api_url, idempotent=True, headers=headers)
+    
+    def metrics(self) -> Dict[str, Any]:
+        """Circuit breaker state, call/retry counters and connection reuse"""
+        with self._lock:
+            stats = dict(self._stats)
+        return {**stats, "breaker": self.breaker.stats(), "http": connection_stats(self.session)}
+    
+    def _request(self, method: str, url: str, idempotent: bool, **kwargs) -> N8NResponse:
+        """Send a request through the breaker, retrying what is safe to retry"""
+        started = time.perf_counter()
+        self._count(requests=1)
+        if not self.breaker.allow():
+            self._count(fast_failed=1)
             return N8NResponse(
                 success=False,
                 status_code=0,
-                body={"error": str(e)}
+                body={"error": f"N8N unavailable after repeated failures, retry in {self.breaker.retry_after():.0f}s"},
+                elapsed_ms=round((time.perf_counter() - started) * 1000, 2),
+                fast_failed=True
             )
+        
+        attempt = 0
+        while True:
+            self._count(upstream_calls=1)
+            try:
+                response = self.session.request(
+                    method=method,
+                    url=url,
+                    timeout=(Config.N8N_CONNECT_TIMEOUT, self.timeout),
+                    **kwargs
+                )
+                
+                failed = response.status_code >= 500
+                retryable = idempotent and response.status_code in RETRY_STATUSES
+                result = N8NResponse(
+                    success=response.status_code < 400,
+                    status_code=response.status_code,
+                    body=response.json() if response.headers.get('content-type', '').startswith('application/json') else response.text
+                )
+            
+            except requests.exceptions.RequestException as e:
+                failed = True
+                retryable = idempotent or _never_sent(e)
+                result = N8NResponse(
+                    success=False,
+                    status_code=0,
+                    body={"error": str(e)}
+                )
+            
+            if not retryable or attempt >= self.max_retries:
+                break
+            
+            # Full jitter: callers that failed together don't retry together
+            delay = random.uniform(0, min(MAX_RETRY_DELAY, Config.N8N_RETRY_BACKOFF * 2 ** attempt))
+            attempt += 1
+            self._count(retries=1)
+            time.sleep(delay)
+        
+        self.breaker.record(not failed)
+        if failed:
+            self._count(errors=1)
+        result.elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+        return result
+    
+    def _count(self, **counters):
+        with self._lock:
+            for name, value in counters.items():
+                self._stats[name] += value
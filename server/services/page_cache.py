@@ -0,0 +1,145 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+from config.settings import Config
+from storage import SQLiteFile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    url TEXT PRIMARY KEY,
+    etag TEXT,
+    last_modified TEXT,
+    page TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_pages_used ON pages (used);
+"""
+
+class PageCache:
+    """On-disk cache of scraped pages, revalidated with conditional GETs
+
+    Keyed by canonical URL, each entry keeps the page's ETag/Last-Modified
+    and its extracted result, so a 304 answer skips download and parsing.
+    Entries are evicted least recently used first once their total size
+    passes ``max_bytes``. The SQLite file can be shared by every worker.
+
+    Cache errors never fail a scrape: they are logged and the page is fetched
+    uncached, and a database that can't be opened (e.g. on a read-only
+    filesystem) turns the cache off for the rest of the process.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.db = SQLiteFile(path, setup=lambda conn: conn.executescript(SCHEMA))
+        self._counter_lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.evictions = 0
+        self.errors = 0
+        self.last_error = None
+        self.disabled = False
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        try:
+            return self.db.conn
+        except sqlite3.Error:
+            # Opening fails the same way on every call, so stop trying
+            self.disabled = True
+            raise
+
+    def _failed(self, error: sqlite3.Error):
+        """Log a cache error; the caller carries on as if the page weren't cached"""
+        with self._counter_lock:
+            self.errors += 1
+            self.last_error = str(error)
+        print(f"Warning: scrape page cache {self.path} failed ({error}), "
+              f"{'disabling it' if self.disabled else 'fetching uncached'}")
+
+    def get(self, url: str) -> Optional[Dict[str, Any]]:
+        """Validators and extracted page stored for ``url``, or None"""
+        if self.disabled:
+            return None
+        try:
+            row = self.conn.execute("SELECT etag, last_modified, page FROM pages WHERE url = ?", (url,)).fetchone()
+        except sqlite3.Error as e:
+            self._failed(e)
+            return None
+        with self._counter_lock:
+            self.lookups += 1
+        if row is None:
+            return None
+        return {"etag": row[0], "last_modified": row[1], "page": json.loads(row[2])}
+
+    def hit(self, url: str):
+        """Record that the server confirmed the stored page is current"""
+        with self._counter_lock:
+            self.hits += 1
+        try:
+            self.conn.execute("UPDATE pages SET used = ? WHERE url = ?", (time.time(), url))
+        except sqlite3.Error as e:
+            self._failed(e)
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], page: Dict[str, Any]):
+        """Store a freshly extracted page, evicting the least recently used ones beyond the size cap"""
+        if self.disabled:
+            return
+        try:
+            self._put(url, etag, last_modified, page)
+        except sqlite3.Error as e:
+            self._failed(e)
+
+    def _put(self, url: str, etag: Optional[str], last_modified: Optional[str], page: Dict[str, Any]):
+        data = json.dumps(page, ensure_ascii=False)
+        size = len(data.encode())
+        if size > self.max_bytes:
+            return
+
+        evicted = []
+        with self.db.write(self.conn) as conn:
+            conn.execute("INSERT OR REPLACE INTO pages (url, etag, last_modified, page, size, used) VALUES (?, ?, ?, ?, ?, ?)",
+                         (url, etag, last_modified, data, size, time.time()))
+            excess = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0] - self.max_bytes
+            if excess > 0:
+                for old_url, old_size in conn.execute("SELECT url, size FROM pages ORDER BY used"):
+                    if excess <= 0:
+                        break
+                    evicted.append((old_url,))
+                    excess -= old_size
+                conn.executemany("DELETE FROM pages WHERE url = ?", evicted)
+
+        if evicted:
+            with self._counter_lock:
+                self.evictions += len(evicted)
+
+    def stats(self) -> Dict[str, Any]:
+        entries = size = None
+        if not self.disabled:
+            try:
+                entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+            except sqlite3.Error as e:
+                self._failed(e)
+        with self._counter_lock:
+            return {
+                "disabled": self.disabled,
+                "errors": self.errors,
+                "last_error": self.last_error,
+                "entries": entries,
+                "bytes": size,
+                "max_bytes": self.max_bytes,
+                "revalidated": self.hits,
+                "misses": self.lookups - self.hits,
+                "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+                "evictions": self.evictions
+            }
+
+def create_page_cache(path: str = None) -> Optional[PageCache]:
+    """Page cache at SCRAPE_CACHE_PATH, or None when caching is disabled"""
+    path = Config.SCRAPE_CACHE_PATH if path is None else path
+    if not path:
+        return None
+    return PageCache(path, int(Config.SCRAPE_CACHE_MAX_MB * 1024 * 1024))
@@ -0,0 +1,349 @@
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from email.message import Message
+from typing import Dict, Any, Iterable, List, Optional, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+from bs4 import BeautifulSoup
+from config.settings import Config
+from .page_cache import PageCache
+
+try:
+    from lxml import etree
+except ImportError:
+    etree = None
+
+# Characters of page text kept per page
+EXTRACT_LIMIT = 2000
+
+# Elements whose text makes up the extract, in document order
+TEXT_TAGS = frozenset(('p', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'))
+
+# Elements whose content is never page text (BeautifulSoup's get_text skips it too)
+SKIPPED_TAGS = frozenset(('script', 'style', 'template'))
+
+# Bytes (or characters) handed to the extractor at a time
+FEED_SIZE = 64 * 1024
+
+# Content types the scrape agent parses; a response without Content-Type is tried as HTML
+HTML_TYPES = ('text/html', 'application/xhtml+xml')
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+class ScrapeError(Exception):
+    """The page can't be scraped: not HTML, or larger than SCRAPE_MAX_PAGE_MB"""
+
+def canonical_url(url: str) -> Optional[str]:
+    """Normal form of an http(s) URL used to spot duplicates, or None for other schemes
+
+    Lowercases scheme and host, drops default ports and the fragment, sorts
+    query parameters and gives an empty path "/".
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = parts.hostname
+    if port and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, parts.path or '/', query, ''))
+
+class PageExtractor:
+    """Incremental lxml extraction of a page's title, description, text and links
+
+    HTML is fed in pieces as it arrives; once the text budget is full (and no
+    links are wanted) ``done`` turns True and the rest of the page can be
+    skipped. Parsed elements are dropped as soon as their text is taken, so
+    memory stays flat however large the page is.
+    """
+
+    def __init__(self, base_url: str, links: bool = False, limit: int = EXTRACT_LIMIT,
+                 encoding: Optional[str] = None):
+        self.base_url = base_url
+        self.limit = limit
+        self.links = [] if links else None
+        self.title = None
+        self.description = None
+        self.done = False
+        self._title_seen = False
+        # Bytes without a declared encoding are decoded by libxml2 from the page's <meta charset>
+        try:
+            self._parser = etree.HTMLPullParser(events=('start', 'end'), encoding=encoding)
+        except LookupError:
+            self._parser = etree.HTMLPullParser(events=('start', 'end'))
+        # Text of each text element by start order (None while open), and the open ones
+        self._texts = []
+        self._open = []
+        self._parts = []
+        self._next = 0
+        self._length = 0
+
+    def feed(self, data: Union[str, bytes]):
+        if not self.done:
+            self._parser.feed(data)
+            self._read_events()
+
+    def close(self) -> Tuple[Dict[str, Any], List[str]]:
+        """The extracted page and its links, as extract_page returns them"""
+        if not self.done:
+            try:
+                self._parser.close()
+            except etree.XMLSyntaxError:
+                # Nothing parseable, e.g. an empty body
+                pass
+            self._read_events()
+        page = {
+            "title": self.title if self._title_seen else "",
+            "description": self.description or "",
+            "extract": " ".join(self._parts)[:self.limit]
+        }
+        return page, self.links or []
+
+    def _read_events(self):
+        for event, elem in self._parser.read_events():
+            tag = elem.tag
+            if event == 'start':
+                if tag in TEXT_TAGS:
+                    self._open.append(len(self._texts))
+                    self._texts.append(None)
+                elif tag == 'a' and self.links is not None:
+                    href = elem.get('href')
+                    link = canonical_url(urljoin(self.base_url, href)) if href is not None else None
+                    if link:
+                        self.links.append(link)
+                elif tag == 'meta' and self.description is None and elem.get('name') == 'description':
+                    self.description = elem.get('content', '')
+                continue
+
+            if tag in TEXT_TAGS:
+                self._texts[self._open.pop()] = " ".join(s for s in (t.strip() for t in elem.itertext()) if s)
+                self._collect()
+                if self.done:
+                    return
+            elif tag in SKIPPED_TAGS:
+                elem.text = None
+            elif tag == 'title' and not self._title_seen:
+                self._title_seen = True
+                self.title = elem.text if len(elem) == 0 else None
+
+            # Text elements read their descendants at their own end, so only prune outside them
+            if not self._open:
+                elem.clear(keep_tail=True)
+                parent = elem.getparent()
+                while parent is not None and elem.getprevious() is not None:
+                    del parent[0]
+
+    def _collect(self):
+        """Move finished texts, in document order, into the extract"""
+        while self._next < len(self._texts) and self._texts[self._next] is not None:
+            text = self._texts[self._next]
+            if text:
+                self._length += len(text) + (1 if self._parts else 0)
+                self._parts.append(text)
+            self._next += 1
+        if self._length >= self.limit and self.links is None:
+            self.done = True
+
+class SoupExtractor:
+    """BeautifulSoup ``html.parser`` extraction, fed like PageExtractor but parsed whole on close"""
+
+    done = False
+
+    def __init__(self, base_url: str, links: bool = False, limit: int = EXTRACT_LIMIT,
+                 encoding: Optional[str] = None):
+        self.base_url = base_url
+        self.links = links
+        self.limit = limit
+        self.encoding = encoding
+        self._chunks = []
+
+    def feed(self, data: Union[str, bytes]):
+        self._chunks.append(data)
+
+    def close(self) -> Tuple[Dict[str, Any], List[str]]:
+        html = self._chunks[0][:0].join(self._chunks) if self._chunks else ''
+        soup = BeautifulSoup(html, 'html.parser', from_encoding=self.encoding if isinstance(html, bytes) else None)
+
+        title = soup.title.string if soup.title else ""
+
+        text_elements = soup.find_all(['p', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+        text = " ".join([elem.get_text(' ', strip=True) for elem in text_elements if elem.get_text(strip=True)])[:self.limit]
+
+        meta_desc = soup.find('meta', attrs={'name': 'description'})
+        description = meta_desc.get('content', '') if meta_desc else ""
+
+        found = []
+        if self.links:
+            for anchor in soup.find_all('a', href=True):
+                link = canonical_url(urljoin(self.base_url, anchor['href']))
+                if link:
+                    found.append(link)
+
+        return {"title": title, "description": description, "extract": text}, found
+
+def page_extractor(base_url: str, links: bool = False, encoding: Optional[str] = None):
+    """Extractor selected by SCRAPE_EXTRACTOR, falling back to BeautifulSoup without lxml"""
+    if etree is not None and Config.SCRAPE_EXTRACTOR == 'lxml':
+        return PageExtractor(base_url, links, encoding=encoding)
+    return SoupExtractor(base_url, links, encoding=encoding)
+
+def extract_page(html: Union[str, bytes], base_url: str, links: bool = False) -> Tuple[Dict[str, Any], List[str]]:
+    """Title, meta description and leading text of a page, plus its canonical http(s) links if asked"""
+    extractor = page_extractor(base_url, links)
+    for start in range(0, len(html), FEED_SIZE):
+        extractor.feed(html[start:start + FEED_SIZE])
+        if extractor.done:
+            break
+    return extractor.close()
+
+def content_type(header: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Media type and charset of a Content-Type header"""
+    if not header:
+        return None, None
+    message = Message()
+    message['content-type'] = header
+    return message.get_content_type(), message.get_param('charset')
+
+def fetch_page(session: requests.Session, url: str, timeout: float = 10, links: bool = False,
+               cache: Optional[PageCache] = None) -> Tuple[Dict[str, Any], List[str]]:
+    """Download and extract one page; raises requests exceptions or ScrapeError on failure
+
+    The body is streamed into the extractor in chunks and never held whole:
+    non-HTML responses and bodies over SCRAPE_MAX_PAGE_MB are refused, and
+    reading stops as soon as the extract is complete. ``content_length`` is
+    the body size in bytes; when reading stopped early (``truncated``) it is
+    taken from Content-Length, or None if that is missing or counts a
+    compressed body.
+
+    With a cache, a page stored earlier is revalidated with If-None-Match /
+    If-Modified-Since and, on 304 Not Modified, returned without parsing.
+    """
+    key = canonical_url(url) or url
+    entry = cache.get(key) if cache is not None else None
+    # A page cached without its links can't serve a crawl that follows them
+    if entry is not None and links and entry["page"]["links"] is None:
+        entry = None
+
+    headers = {}
+    if entry is not None:
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    max_bytes = int(Config.SCRAPE_MAX_PAGE_MB * 1024 * 1024)
+    with session.get(url, timeout=timeout, headers=headers, stream=True) as response:
+        if response.status_code == 304 and headers:
+            cache.hit(key)
+            stored = entry["page"]
+            page = {k: stored.get(k) for k in ("title", "description", "extract", "content_length", "truncated")}
+            return {"url": url, **page, "cached": True}, stored["links"] or []
+        response.raise_for_status()
+
+        media_type, charset = content_type(response.headers.get("Content-Type"))
+        if media_type is not None and media_type not in HTML_TYPES:
+            raise ScrapeError(f"Unsupported content type: {media_type}")
+        declared = response.headers.get("Content-Length")
+        declared = int(declared) if declared and declared.isdigit() else None
+        if declared is not None and declared > max_bytes:
+            raise ScrapeError(f"Page too large: {declared} bytes (limit {max_bytes})")
+
+        extractor = page_extractor(response.url or url, links, charset)
+        received = 0
+        for chunk in response.iter_content(FEED_SIZE):
+            received += len(chunk)
+            if received > max_bytes:
+                raise ScrapeError(f"Page too large: over {max_bytes} bytes")
+            extractor.feed(chunk)
+            if extractor.done:
+                break
+
+        page, found = extractor.close()
+        # Content-Length counts the encoded body, so it only stands in for an identity-encoded one
+        identity = response.headers.get("Content-Encoding", "identity") == "identity"
+        page["truncated"] = extractor.done
+        if not extractor.done:
+            page["content_length"] = received
+        else:
+            page["content_length"] = declared if identity else None
+
+    etag, last_modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+    if cache is not None and (etag or last_modified):
+        cache.put(key, etag, last_modified, {**page, "links": found if links else None})
+    return {"url": url, **page, "cached": False}, found
+
+class Crawler:
+    """Fetches many pages concurrently while staying polite to each host
+
+    At most ``per_host`` requests to one host are in flight, and requests to a
+    host start at least ``delay`` seconds apart. Pages are deduplicated by
+    canonical URL, and links are only followed within the seed URLs' hosts.
+    """
+
+    def __init__(self, session: requests.Session, workers: Optional[int] = None, per_host: Optional[int] = None,
+                 delay: Optional[float] = None, max_pages: Optional[int] = None, timeout: float = 10,
+                 cache: Optional[PageCache] = None):
+        self.session = session
+        self.cache = cache
+        self.workers = workers or Config.SCRAPE_CRAWL_WORKERS
+        self.per_host = per_host or Config.SCRAPE_PER_HOST_LIMIT
+        self.delay = Config.SCRAPE_POLITENESS_DELAY if delay is None else delay
+        self.max_pages = max_pages or Config.SCRAPE_CRAWL_MAX_PAGES
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        # host -> (request slots, [earliest start of its next request])
+        self._hosts = {}
+
+    def crawl(self, urls: Iterable[str], depth: int = 0) -> List[Dict[str, Any]]:
+        """Pages of ``urls`` and, up to ``depth`` links away, the pages they link to, breadth first"""
+        seen, frontier = set(), []
+        for url in urls:
+            url = canonical_url(url)
+            if url and url not in seen and len(seen) < self.max_pages:
+                seen.add(url)
+                frontier.append(url)
+        allowed_hosts = {urlsplit(url).netloc for url in frontier}
+
+        pages = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='crawl') as pool:
+            for level in range(depth + 1):
+                if not frontier:
+                    break
+                follow = level < depth
+                fetched = pool.map(lambda url: self._fetch(url, follow), frontier)
+
+                frontier = []
+                for page, links in fetched:
+                    pages.append({**page, "depth": level})
+                    for link in links:
+                        if link not in seen and len(seen) < self.max_pages and urlsplit(link).netloc in allowed_hosts:
+                            seen.add(link)
+                            frontier.append(link)
+
+        return pages
+
+    def _fetch(self, url: str, links: bool) -> Tuple[Dict[str, Any], List[str]]:
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self.per_host), [0.0])
+            slots, next_start = self._hosts[host]
+
+        with slots:
+            with self._lock:
+                start = max(time.monotonic(), next_start[0])
+                next_start[0] = start + self.delay
+            time.sleep(max(0.0, start - time.monotonic()))
+
+            try:
+                page, found = fetch_page(self.session, url, self.timeout, links, self.cache)
+                return {**page, "status": "success"}, found
+            except Exception as e:
+                return {"url": url, "status": "error", "error": f"Scraping failed: {str(e)}"}, []
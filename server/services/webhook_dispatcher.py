@@ -0,0 +1,338 @@
+import heapq
+import itertools
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass
+from typing import Dict, Any, List, Optional
+from models.n8n_request import N8NWebhookRequest
+from config.settings import Config
+from storage import SQLiteFile
+from .n8n_service import N8NService
+
+# Longest backoff between two delivery attempts, in seconds
+MAX_RETRY_DELAY = 300
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhooks (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    request TEXT NOT NULL,
+    batch INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    owner INTEGER NOT NULL,
+    dead INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_webhooks_owner ON webhooks (owner, dead);
+"""
+
+class DispatchQueueFull(Exception):
+    """Too many webhook events are waiting for delivery"""
+
+@dataclass
+class QueuedWebhook:
+    """A webhook event waiting for delivery"""
+    id: int
+    request: N8NWebhookRequest
+    batch: bool
+    created: float
+    queued_at: float
+    attempts: int = 0
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class WebhookSpool:
+    """SQLite copy of undelivered webhook events, so they survive a restart
+
+    Each row belongs to the process that accepted it. A dispatcher starting
+    up takes over the rows of processes that are gone, so one spool file can
+    be shared by every gunicorn worker on a host. Dead letters stay in the
+    table (``dead = 1``) with their last error.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = SQLiteFile(path, setup=lambda conn: conn.executescript(SCHEMA))
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self.db.conn
+
+    def add(self, request: N8NWebhookRequest, batch: bool, created: float) -> int:
+        cursor = self.conn.execute("INSERT INTO webhooks (request, batch, created, owner) VALUES (?, ?, ?, ?)",
+                                   (json.dumps(asdict(request)), int(batch), created, os.getpid()))
+        return cursor.lastrowid
+
+    def claim(self) -> List[QueuedWebhook]:
+        """Take over undelivered events of processes that no longer run"""
+        pid = os.getpid()
+        with self.db.write() as conn:
+            owners = [owner for (owner,) in conn.execute("SELECT DISTINCT owner FROM webhooks WHERE dead = 0")]
+            # Our own pid here is a previous process that had it (e.g. pid 1 in a container)
+            orphaned = [owner for owner in owners if owner == pid or not _alive(owner)]
+            rows = []
+            for owner in orphaned:
+                rows += conn.execute("SELECT id, request, batch, attempts, created FROM webhooks WHERE owner = ? AND dead = 0",
+                                     (owner,)).fetchall()
+                conn.execute("UPDATE webhooks SET owner = ? WHERE owner = ? AND dead = 0", (pid, owner))
+
+        now = time.monotonic()
+        return [
+            QueuedWebhook(id=id, request=N8NWebhookRequest(**json.loads(request)), batch=bool(batch),
+                          created=created, queued_at=now, attempts=attempts)
+            for id, request, batch, attempts, created in sorted(rows)
+        ]
+
+    def delivered(self, ids: List[int]):
+        self.conn.executemany("DELETE FROM webhooks WHERE id = ?", [(id,) for id in ids])
+
+    def failed(self, ids: List[int], attempts: int, error: str, dead: bool):
+        self.conn.executemany("UPDATE webhooks SET attempts = ?, error = ?, dead = ? WHERE id = ?",
+                              [(attempts, error, int(dead), id) for id in ids])
+
+class WebhookDispatcher:
+    """Delivers N8N webhook events in the background, retrying failed deliveries
+
+    ``submit`` returns as soon as an event is queued (and written to the
+    spool, if one is configured). Worker threads deliver events through the
+    N8NService, so deliveries share its connection pool and circuit breaker.
+    Failed deliveries are retried with jittered exponential backoff; events
+    still failing after ``max_attempts`` tries, or refused with a 4xx answer,
+    become dead letters. Deliveries the circuit breaker refuses wait for it
+    without spending an attempt. Delivery is at least once: a webhook that
+    times out may have run and will be sent again.
+
+    Events submitted with ``batch=True`` for the same webhook are sent
+    together as ``{"events": [body, ...]}``, up to ``batch_size`` per call,
+    after waiting up to ``batch_wait`` seconds for the batch to fill.
+    """
+
+    def __init__(self, service: N8NService, workers: Optional[int] = None, max_pending: Optional[int] = None,
+                 max_attempts: Optional[int] = None, batch_size: Optional[int] = None,
+                 batch_wait: Optional[float] = None, spool_path: Optional[str] = None):
+        self.service = service
+        self.workers = workers or Config.N8N_DISPATCH_WORKERS
+        self.max_pending = max_pending or Config.N8N_DISPATCH_MAX_PENDING
+        self.max_attempts = max_attempts or Config.N8N_DISPATCH_MAX_ATTEMPTS
+        self.batch_size = batch_size or Config.N8N_DISPATCH_BATCH_SIZE
+        self.batch_wait = Config.N8N_DISPATCH_BATCH_WAIT if batch_wait is None else batch_wait
+        spool_path = Config.N8N_DISPATCH_SPOOL_PATH if spool_path is None else spool_path
+        self.spool = WebhookSpool(spool_path) if spool_path else None
+
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        """Empty queue, counters and lock; a process forked from a started dispatcher must not share them"""
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        # Events by (url, method, headers, batch), in the order their webhooks were first waiting
+        self._pending = OrderedDict()
+        # (due, first event id, events) of failed deliveries waiting for their retry
+        self._retrying = []
+        self._due = deque()
+        self._ids = itertools.count(1)
+        self._stats = {
+            "submitted": 0, "delivered": 0, "deliveries": 0, "retries": 0, "dead_letters": 0, "rejected": 0,
+            "queued": 0, "retrying": 0, "in_flight": 0, "total_latency_ms": 0.0, "max_latency_ms": 0.0
+        }
+        self.last_error = None
+
+    def start(self):
+        """Start the workers, and take over orphaned spooled events, in this process
+
+        Runs on first use rather than in create_app: threads don't survive a
+        fork, so workers started in a gunicorn --preload master would never
+        deliver for its children. A child forked after the start gets its own
+        empty queue and workers; the parent keeps delivering what it queued.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._start_lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                self._reset()
+            if self.spool:
+                with self._lock:
+                    for event in self.spool.claim():
+                        self._queue(event)
+            for n in range(self.workers):
+                threading.Thread(target=self._work, name=f'n8n-dispatch-{n}', daemon=True).start()
+            self._pid = pid
+
+    def submit(self, request: N8NWebhookRequest, batch: bool = False) -> Dict[str, Any]:
+        """Queue a webhook event for delivery; raises DispatchQueueFull when at capacity"""
+        if not Config.ENABLE_N8N_WORKFLOWS:
+            raise ValueError("N8N workflows are disabled")
+        request = N8NWebhookRequest(
+            webhook_url=request.webhook_url or self.service.webhook_url,
+            method=request.method.upper(),
+            headers=request.headers,
+            body=request.body
+        )
+        if not request.webhook_url:
+            raise ValueError("webhook_url is required when N8N_WEBHOOK_URL is not set")
+
+        self.start()
+        with self._lock:
+            if self._depth() >= self.max_pending:
+                self._stats["rejected"] += 1
+                raise DispatchQueueFull("Webhook dispatch queue is full, retry later")
+
+        created = time.time()
+        if self.spool:
+            id = self.spool.add(request, batch, created)
+        else:
+            id = next(self._ids)
+
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._queue(QueuedWebhook(id=id, request=request, batch=batch, created=created, queued_at=time.monotonic()))
+            return {"id": id, "depth": self._depth()}
+
+    def _queue(self, event: QueuedWebhook):
+        """Add an event to its webhook's group; the caller holds the lock"""
+        request = event.request
+        key = (request.webhook_url, request.method, json.dumps(request.headers or {}, sort_keys=True), event.batch)
+        self._pending.setdefault(key, deque()).append(event)
+        self._stats["queued"] += 1
+        self._ready.notify()
+
+    def _depth(self) -> int:
+        return self._stats["queued"] + self._stats["retrying"] + self._stats["in_flight"]
+
+    def _work(self):
+        while True:
+            with self._lock:
+                events = self._next()
+            self._deliver(events)
+
+    def _next(self) -> List[QueuedWebhook]:
+        """Wait for the next delivery that is due and take its events; the caller holds the lock"""
+        while True:
+            now = time.monotonic()
+            while self._retrying and self._retrying[0][0] <= now:
+                self._due.append(heapq.heappop(self._retrying)[2])
+            if self._due:
+                events = self._due.popleft()
+                self._stats["retrying"] -= len(events)
+                self._stats["in_flight"] += len(events)
+                return events
+
+            wait = self._retrying[0][0] - now if self._retrying else None
+            for key, group in self._pending.items():
+                batch = key[-1]
+                ready_at = group[0].queued_at + self.batch_wait if batch and len(group) < self.batch_size else now
+                if ready_at <= now:
+                    events = [group.popleft() for _ in range(min(self.batch_size if batch else 1, len(group)))]
+                    if group:
+                        # Let other webhooks go first next time
+                        self._pending.move_to_end(key)
+                    else:
+                        del self._pending[key]
+                    self._stats["queued"] -= len(events)
+                    self._stats["in_flight"] += len(events)
+                    return events
+                wait = ready_at - now if wait is None else min(wait, ready_at - now)
+
+            self._ready.wait(wait)
+
+    def _deliver(self, events: List[QueuedWebhook]):
+        first = events[0].request
+        blocked = self.service.breaker.retry_after()
+        if blocked > 0:
+            # N8N is known to be down: wait for the breaker without spending an attempt
+            self._retry(events, blocked)
+            return
+
+        body = {"events": [event.request.body or {} for event in events]} if events[0].batch else first.body
+        try:
+            response = self.service.execute_webhook(N8NWebhookRequest(
+                webhook_url=first.webhook_url,
+                method=first.method,
+                headers=first.headers,
+                body=body
+            ))
+            status, success = response.status_code, response.success
+            error = response.body.get("error") if isinstance(response.body, dict) else None
+            error = error or f"N8N answered {status}"
+        except Exception as e:
+            response, status, success, error = None, 0, False, str(e)
+
+        if response is not None and response.fast_failed:
+            # The breaker opened, or another call holds its half-open trial, since the check above
+            self._retry(events, max(self.service.breaker.retry_after(), Config.N8N_DISPATCH_RETRY_BACKOFF))
+            return
+
+        ids = [event.id for event in events]
+        if success:
+            if self.spool:
+                self.spool.delivered(ids)
+            now = time.time()
+            with self._lock:
+                self._stats["in_flight"] -= len(events)
+                self._stats["deliveries"] += 1
+                self._stats["delivered"] += len(events)
+                for event in events:
+                    latency = (now - event.created) * 1000
+                    self._stats["total_latency_ms"] += latency
+                    self._stats["max_latency_ms"] = max(self._stats["max_latency_ms"], latency)
+            return
+
+        attempts = max(event.attempts for event in events) + 1
+        for event in events:
+            event.attempts = attempts
+        # A 4xx other than timeout/rate limiting will be refused again
+        dead = attempts >= self.max_attempts or (400 <= status < 500 and status not in (408, 429))
+        if self.spool:
+            self.spool.failed(ids, attempts, error, dead)
+
+        with self._lock:
+            self.last_error = error
+            self._stats["deliveries"] += 1
+            if dead:
+                self._stats["in_flight"] -= len(events)
+                self._stats["dead_letters"] += len(events)
+            else:
+                self._stats["retries"] += 1
+        if not dead:
+            self._retry(events, random.uniform(0, min(MAX_RETRY_DELAY, Config.N8N_DISPATCH_RETRY_BACKOFF * 2 ** (attempts - 1))))
+
+    def _retry(self, events: List[QueuedWebhook], delay: float):
+        with self._lock:
+            # Event ids break ties, so the heap never compares event lists
+            heapq.heappush(self._retrying, (time.monotonic() + delay, events[0].id, events))
+            self._stats["in_flight"] -= len(events)
+            self._stats["retrying"] += len(events)
+            self._ready.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, delivery counters and latency from submit to delivery"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update(
+                workers=self.workers,
+                depth=self._depth(),
+                max_pending=self.max_pending,
+                avg_latency_ms=round(stats["total_latency_ms"] / stats["delivered"], 2) if stats["delivered"] else None,
+                total_latency_ms=round(stats["total_latency_ms"], 2),
+                max_latency_ms=round(stats["max_latency_ms"], 2),
+                last_error=self.last_error,
+                spool=self.spool.path if self.spool else None
+            )
+            return stats
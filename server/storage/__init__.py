@@ -0,0 +1,21 @@
+# Storage package
+from .cursor import *
+from .columns import *
+from .rollups import *
+from .sqlite_file import *
+from .memory_storage import *
+from .sqlite_storage import *
+
+def create_storage(database_url: str):
+    """Build the storage backend described by a DATABASE_URL"""
+    if database_url.startswith('sqlite://'):
+        path = database_url[len('sqlite://'):]
+        # sqlite:///relative.db -> relative.db, sqlite:////abs.db -> /abs.db
+        path = path[1:] if path.startswith('/') else path
+        return SQLiteStorage(path or ':memory:')
+
+    if database_url.startswith('memory://'):
+        return MemoryStorage()
+
+    print(f"Warning: Unsupported DATABASE_URL scheme '{database_url.split('://')[0]}', using in-memory storage")
+    return MemoryStorage()
@@ -0,0 +1,147 @@
+from array import array
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from typing import Dict, Any, Iterator, List, Optional
+
+# created_at is kept as integer microseconds from this (naive) epoch
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+# Stands in for the empty {} most JSON columns hold, so rows don't each keep their own
+_EMPTY = object()
+
+class NumberColumn:
+    """Machine floats or integers in a typed array"""
+
+    def __init__(self, typecode: str, kind: type):
+        self.data = array(typecode)
+        self.kind = kind
+
+    def append(self, value):
+        # Exact type check: array('d') would silently turn ints into floats
+        if type(value) is not self.kind:
+            raise TypeError(f"Expected {self.kind.__name__}")
+        self.data.append(value)
+
+    def __getitem__(self, pos: int):
+        return self.data[pos]
+
+    def tolist(self) -> List[Any]:
+        return self.data.tolist()
+
+class InternedColumn:
+    """Low-cardinality values stored once, with a small integer code per row"""
+
+    def __init__(self):
+        self.data = array('i')
+        self.values = []
+        # Keyed by (type, value) so 1, 1.0 and True keep their own codes
+        self.codes = {}
+
+    def append(self, value):
+        key = (value.__class__, value)
+        code = self.codes.get(key)
+        if code is None:
+            code = self.codes[key] = len(self.values)
+            self.values.append(value)
+        self.data.append(code)
+
+    def __getitem__(self, pos: int):
+        return self.values[self.data[pos]]
+
+    def tolist(self) -> List[Any]:
+        values = self.values
+        return [values[code] for code in self.data]
+
+class ObjectColumn:
+    """Free text and nested JSON, one reference per row"""
+
+    def __init__(self, values: Optional[List[Any]] = None):
+        self.data = values if values is not None else []
+
+    def append(self, value):
+        self.data.append(_EMPTY if type(value) is dict and not value else value)
+
+    def __getitem__(self, pos: int):
+        value = self.data[pos]
+        return {} if value is _EMPTY else value
+
+    def tolist(self) -> List[Any]:
+        return [self[pos] for pos in range(len(self.data))]
+
+COLUMN_KINDS = {
+    'float': lambda: NumberColumn('d', float),
+    'int': lambda: NumberColumn('q', int),
+    'interned': InternedColumn,
+    'object': ObjectColumn
+}
+
+class ColumnTable:
+    """Rows of one collection stored column by column, in insertion order
+
+    Row dicts are only built when a row is read back. A value that doesn't fit
+    its column's storage (None in a float column, unhashable interned values)
+    turns that column into a plain object column rather than being rejected.
+    """
+
+    def __init__(self, columns: Dict[str, str]):
+        self.ids = array('q')
+        self.created = array('q')
+        self.columns = {name: COLUMN_KINDS[kind]() for name, kind in columns.items()}
+        self._readers()
+        # Rows written in the same second share its formatted prefix
+        self._second = (None, '')
+
+    def _readers(self):
+        # Plain array indexing is a C call; only the other kinds need Python code
+        self.fields = ('id',) + tuple(self.columns)
+        self.getters = (self.ids.__getitem__,) + tuple(
+            column.data.__getitem__ if isinstance(column, NumberColumn) else column.__getitem__
+            for column in self.columns.values())
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def append(self, record_id: int, row: Dict[str, Any], created_at: datetime) -> int:
+        """Store a row and return its position; ids must be appended in increasing order"""
+        for name, column in self.columns.items():
+            value = row.get(name)
+            try:
+                column.append(value)
+            except (TypeError, OverflowError):
+                column = self.columns[name] = ObjectColumn(column.tolist())
+                column.append(value)
+                self._readers()
+
+        self.ids.append(record_id)
+        self.created.append((created_at - EPOCH) // MICROSECOND)
+        return len(self.ids) - 1
+
+    def position(self, record_id: int) -> Optional[int]:
+        """Position of the row with an id, if stored"""
+        pos = bisect_left(self.ids, record_id)
+        return pos if pos < len(self.ids) and self.ids[pos] == record_id else None
+
+    def value(self, pos: int, name: str):
+        if name == 'id':
+            return self.ids[pos]
+        return self.columns[name][pos]
+
+    def _created_at(self, pos: int) -> str:
+        # Same text as datetime.isoformat(), formatting each second only once
+        second, micros = divmod(self.created[pos], 1000000)
+        cached_second, prefix = self._second
+        if second != cached_second:
+            prefix = (EPOCH + timedelta(seconds=second)).isoformat()
+            self._second = (second, prefix)
+        return f"{prefix}.{micros:06d}" if micros else prefix
+
+    def row(self, pos: int) -> Dict[str, Any]:
+        """Build the dict form of a stored row"""
+        record = {name: get(pos) for name, get in zip(self.fields, self.getters)}
+        record["created_at"] = self._created_at(pos)
+        return record
+
+    def rows(self) -> Iterator[Dict[str, Any]]:
+        for pos in range(len(self.ids)):
+            yield self.row(pos)
@@ -0,0 +1,32 @@
+import base64
+import json
+from typing import Dict, Any
+
+# Sort key of each collection's "newest first" listing; cursors carry these values
+ORDER_BY = {
+    'transactions': ('id',),
+    'campaigns': ('id',),
+    'metrics': ('date', 'id'),
+    'insights': ('id',),
+    'suggestions': ('id',)
+}
+
+def row_key(collection: str, row: Dict[str, Any]) -> tuple:
+    """Order key of a row, as accepted by the backends' ``after`` argument"""
+    return tuple(row[field] for field in ORDER_BY[collection])
+
+def encode_cursor(collection: str, row: Dict[str, Any]) -> str:
+    """Opaque cursor pointing just after a row in its collection's ordering"""
+    key = list(row_key(collection, row))
+    return base64.urlsafe_b64encode(json.dumps(key, separators=(',', ':')).encode()).decode().rstrip('=')
+
+def decode_cursor(collection: str, cursor: str) -> tuple:
+    """Decode a cursor back into the order key it was built from"""
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(key, list) or len(key) != len(ORDER_BY[collection]) or not isinstance(key[-1], int):
+        raise ValueError("Invalid cursor")
+    return tuple(key)
@@ -0,0 +1,245 @@
+import itertools
+import threading
+from array import array
+from bisect import bisect_left, insort
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, List, Optional
+from .columns import ColumnTable
+from .rollups import ROLLUPS, GRAINS, rollup_periods
+
+class MemoryStorage:
+    """Process-local storage backend for development and tests
+
+    Data lives in one process only; run a single worker (or use SQLite) when
+    several gunicorn workers must see the same rows. Ids count up from 1 in
+    each collection, as SQLite's AUTOINCREMENT columns do.
+    """
+
+    # Stored columns and how each is kept: typed arrays for numbers, one shared
+    # copy per distinct value for repetitive text, plain references otherwise
+    COLUMNS = {
+        'transactions': {'date': 'interned', 'type': 'interned', 'account': 'interned',
+                         'counterparty': 'interned', 'currency': 'interned', 'amount': 'float',
+                         'category': 'interned', 'description': 'object', 'meta': 'object'},
+        'campaigns': {'platform': 'interned', 'external_id': 'object', 'name': 'object',
+                      'objective': 'interned', 'status': 'interned', 'budget_daily': 'float',
+                      'start_date': 'interned', 'end_date': 'interned', 'targeting': 'object'},
+        'metrics': {'campaign_id': 'interned', 'date': 'interned', 'impressions': 'int', 'clicks': 'int',
+                    'spend': 'float', 'conversions': 'int', 'revenue': 'float', 'metrics': 'object'},
+        'insights': {'topic': 'object', 'summary': 'object', 'score': 'object', 'data': 'object'},
+        'suggestions': {'title': 'object', 'body': 'object', 'tags': 'object'}
+    }
+
+    # Fields with a secondary index (field value -> row positions in collection order)
+    INDEXED_FIELDS = {
+        'transactions': ('account', 'category'),
+        'campaigns': ('platform',),
+        'metrics': ('campaign_id',),
+        'insights': (),
+        'suggestions': ()
+    }
+
+    def __init__(self):
+        self.tables = {name: ColumnTable(columns) for name, columns in self.COLUMNS.items()}
+        # Row positions in (date, id) order; other collections are ordered by position itself
+        self.order = {'metrics': array('q')}
+        self.indexes = {name: {field: {} for field in fields}
+                        for name, fields in self.INDEXED_FIELDS.items()}
+        # (grain, period, *keys) -> [*sums, row count]
+        self.rollup_tables = {collection: {} for collection in ROLLUPS}
+        # One lock per collection: writers to different collections never wait on each other
+        self.locks = {name: threading.RLock() for name in self.INDEXED_FIELDS}
+        self._ids = {name: itertools.count(1) for name in self.COLUMNS}
+
+    def _get_next_id(self, collection: str) -> int:
+        """Get next available ID of a collection"""
+        # next() on itertools.count is a single atomic step, so concurrent callers never share an id
+        return next(self._ids[collection])
+
+    def _sort_key(self, collection: str):
+        """Function mapping a row position to its collection's order key"""
+        table = self.tables[collection]
+        if collection == 'metrics':
+            dates = table.columns['date']
+            return lambda pos: (str(dates[pos]), table.ids[pos])
+        return table.ids.__getitem__
+
+    def insert(self, collection: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a row and return it with its id and creation timestamp"""
+        with self.locks[collection]:
+            # Checked before anything is stored, so a rejected row leaves table and rollups untouched
+            rollup_key = self._rollup_key(collection, row)
+            # Ids are taken under the lock so positions stay in id order
+            table = self.tables[collection]
+            pos = table.append(self._get_next_id(collection), row, datetime.now())
+            record = table.row(pos)
+
+            if collection in self.order:
+                # Metric dates can arrive out of order, so their positions are sorted in
+                sort_key = self._sort_key(collection)
+                insort(self.order[collection], pos, key=sort_key)
+            for field, index in self.indexes[collection].items():
+                try:
+                    positions = index.setdefault(record[field], array('q'))
+                except TypeError:
+                    # Unhashable values (nested JSON) can never match a query-string filter
+                    continue
+                if collection in self.order:
+                    insort(positions, pos, key=sort_key)
+                else:
+                    positions.append(pos)
+
+            self._update_rollups(collection, record, rollup_key)
+        return record
+
+    def _rollup_key(self, collection: str, row: Dict[str, Any]) -> Optional[tuple]:
+        """Group key of a row's rollups; raises TypeError for values that can't be grouped on"""
+        if collection not in ROLLUPS:
+            return None
+        keys = tuple(row.get(k) for k in ROLLUPS[collection]['keys'])
+        try:
+            hash(keys)
+        except TypeError:
+            raise TypeError(f"Rollup keys ({', '.join(ROLLUPS[collection]['keys'])}) must be scalar values")
+        return keys
+
+    def _update_rollups(self, collection: str, record: Dict[str, Any], keys: Optional[tuple] = None):
+        """Add one row to its daily and monthly totals"""
+        if collection not in ROLLUPS:
+            return
+        spec = ROLLUPS[collection]
+        keys = self._rollup_key(collection, record) if keys is None else keys
+        values = [record.get(c) or 0 for c in spec['sums']]
+        table = self.rollup_tables[collection]
+        for grain, period in rollup_periods(record):
+            totals = table.get((grain, period) + keys)
+            if totals is None:
+                totals = table[(grain, period) + keys] = [0] * len(values) + [0]
+            for i, value in enumerate(values):
+                totals[i] += value
+            totals[-1] += 1
+
+    def rebuild_rollups(self) -> Dict[str, int]:
+        """Recompute every rollup table from the raw rows"""
+        counts = {}
+        for collection in ROLLUPS:
+            with self.locks[collection]:
+                self.rollup_tables[collection] = {}
+                for record in self.tables[collection].rows():
+                    self._update_rollups(collection, record)
+                counts[collection] = len(self.rollup_tables[collection])
+        return counts
+
+    def rollups(self, collection: str, grain: str, filters: Optional[Dict[str, Any]] = None,
+                date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Read running totals of one grain, oldest period first"""
+        spec = ROLLUPS[collection]
+        width = GRAINS[grain]
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        with self.locks[collection]:
+            entries = [(k, list(v)) for k, v in self.rollup_tables[collection].items()]
+
+        rows = []
+        for (row_grain, period, *keys), totals in entries:
+            if row_grain != grain:
+                continue
+            if date_from and period < date_from[:width]:
+                continue
+            if date_to and period > date_to[:width]:
+                continue
+            record = {'grain': grain, 'period': period, **dict(zip(spec['keys'], keys)),
+                      **dict(zip(spec['sums'], totals)), 'rows': totals[-1]}
+            if all(record[f] == v for f, v in filters.items()):
+                rows.append(record)
+
+        # NULL, then numbers, then text within a period, matching SQLite's ORDER BY
+        return sorted(rows, key=lambda r: (r['period'],) + tuple(
+            (r[k] is not None, isinstance(r[k], str), r[k]) for k in spec['keys']))
+
+    def insert_many(self, collection: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store many rows, returning them in the same order"""
+        # Held across the batch so readers see all of it or none of it
+        with self.locks[collection]:
+            # Reject the batch before storing any of it, as SQLite's rollback would
+            for row in rows:
+                self._rollup_key(collection, row)
+            return [self.insert(collection, row) for row in rows]
+
+    def list(self, collection: str, filters: Optional[Dict[str, Any]] = None, limit: int = 200,
+             after: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Return the newest rows of a collection matching all equality filters
+
+        ``after`` is an order key from a cursor; only rows ordered before it are returned.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        with self.locks[collection]:
+            return self._list(collection, filters, limit, after)
+
+    def _list(self, collection: str, filters: Dict[str, Any], limit: int,
+              after: Optional[tuple]) -> List[Dict[str, Any]]:
+        table = self.tables[collection]
+        indexes = self.indexes[collection]
+
+        indexed = [f for f in filters if f in indexes]
+        if indexed:
+            # Start from the most selective index so the cost follows the result size
+            positions = min((indexes[f].get(filters[f], ()) for f in indexed), key=len)
+        else:
+            positions = self.order.get(collection, range(len(table)))
+
+        # Positions are kept in collection order, so newest first is a reverse walk
+        # that stops at the limit; a cursor just moves the start with a binary search
+        start = len(positions)
+        if after is not None:
+            bound = (str(after[0]), after[1]) if collection == 'metrics' else after[0]
+            start = bisect_left(positions, bound, key=self._sort_key(collection))
+
+        # Filters are checked column by column; dicts are built only for returned rows
+        rows = []
+        for i in range(start - 1, -1, -1):
+            pos = positions[i]
+            if all(table.value(pos, f) == v for f, v in filters.items()):
+                rows.append(table.row(pos))
+                if len(rows) == limit:
+                    break
+        return rows
+
+    def _metric_group_key(self, group_by: str, campaign_id, day: str):
+        if group_by == 'campaign':
+            return campaign_id
+        if group_by == 'platform':
+            campaigns = self.tables['campaigns']
+            pos = campaigns.position(campaign_id) if isinstance(campaign_id, int) else None
+            return campaigns.value(pos, 'platform') if pos is not None else None
+
+        if group_by == 'day':
+            return day
+        if group_by == 'month':
+            return day[:7]
+        try:
+            # Monday of the ISO week
+            d = date.fromisoformat(day)
+        except ValueError:
+            return None
+        return (d - timedelta(days=d.weekday())).isoformat()
+
+    def aggregate_metrics(self, group_by: str, filters: Optional[Dict[str, Any]] = None,
+                          date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Sum metric counters per group from the daily rollups"""
+        groups = {}
+        for daily in self.rollups('metrics', 'day', filters, date_from, date_to):
+            key = self._metric_group_key(group_by, daily['campaign_id'], daily['period'])
+            totals = groups.get(key)
+            if totals is None:
+                totals = groups[key] = [0, 0, 0.0, 0, 0.0, 0]
+            totals[0] += daily['impressions']
+            totals[1] += daily['clicks']
+            totals[2] += daily['spend']
+            totals[3] += daily['conversions']
+            totals[4] += daily['revenue']
+            totals[5] += daily['rows']
+
+        fields = ('impressions', 'clicks', 'spend', 'conversions', 'revenue', 'rows')
+        # NULL, then numbers, then text, matching SQLite's ORDER BY
+        ordered = sorted(groups.items(), key=lambda kv: (kv[0] is not None, isinstance(kv[0], str), kv[0]))
+        return [{'key': k, **dict(zip(fields, totals))} for k, totals in ordered]
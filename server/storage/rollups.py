@@ -0,0 +1,26 @@
+from typing import Dict, Any, List, Tuple
+
+# Running totals kept per (grain, period, *keys) for each rolled-up collection
+ROLLUPS = {
+    'metrics': {
+        'table': 'metric_rollups',
+        'keys': ('campaign_id',),
+        'sums': ('impressions', 'clicks', 'spend', 'conversions', 'revenue')
+    },
+    'transactions': {
+        'table': 'transaction_rollups',
+        'keys': ('account', 'category', 'currency'),
+        'sums': ('amount',)
+    }
+}
+
+# Length of the ISO date prefix naming a period of each grain
+GRAINS = {
+    'day': 10,
+    'month': 7
+}
+
+def rollup_periods(row: Dict[str, Any]) -> List[Tuple[str, str]]:
+    """(grain, period) pairs a row contributes to"""
+    day = str(row['date'])
+    return [(grain, day[:width]) for grain, width in GRAINS.items()]
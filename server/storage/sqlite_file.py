@@ -0,0 +1,77 @@
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Optional
+
+class SQLiteFile:
+    """Per-thread connections to one SQLite database, set up for concurrent readers and a single writer
+
+    Each thread gets its own autocommit connection, so compiled statements
+    stay cached per thread; ``setup`` runs on every new connection (e.g. to
+    create the schema). File databases use WAL, so readers never block the
+    writer. ``:memory:`` is a shared-cache database seen by every thread of
+    the process.
+    """
+
+    # Seconds a writer waits for another thread or process to release the write lock
+    BUSY_TIMEOUT = 30
+
+    def __init__(self, path: str, setup: Optional[Callable[[sqlite3.Connection], None]] = None):
+        self.path = path
+        self.in_memory = path == ':memory:'
+        self._setup = setup
+        self._local = threading.local()
+        # Shared-cache in-memory databases report lock conflicts without waiting,
+        # so their writers queue on a process lock instead
+        self._memory_write_lock = threading.Lock()
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a new connection; transactions are opened explicitly by write()"""
+        if self.in_memory:
+            # Shared-cache URI so every thread sees the same in-memory database
+            conn = sqlite3.connect(f"file:egy_discovery_{id(self)}?mode=memory&cache=shared",
+                                   uri=True, check_same_thread=False, cached_statements=256,
+                                   timeout=self.BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA read_uncommitted=1")
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, cached_statements=256,
+                                   timeout=self.BUSY_TIMEOUT, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        if self._setup is not None:
+            self._setup(conn)
+        return conn
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This thread's connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self.connect()
+        return conn
+
+    @contextmanager
+    def write(self, conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+        """Write transaction that takes SQLite's database-wide write lock up front
+
+        BEGIN IMMEDIATE makes concurrent writers, in this process or another
+        one sharing the file, wait their turn instead of failing to upgrade a
+        read lock; AUTOINCREMENT ids taken inside are unique across all of them.
+        """
+        conn = conn or self.conn
+        lock = self._memory_write_lock if self.in_memory else None
+        if lock:
+            lock.acquire()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+                conn.execute("COMMIT")
+            except BaseException:
+                # Also undoes a failed COMMIT, so the connection isn't left inside a transaction
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        finally:
+            if lock:
+                lock.release()
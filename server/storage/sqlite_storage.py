@@ -0,0 +1,352 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from .cursor import ORDER_BY
+from .rollups import ROLLUPS, GRAINS, rollup_periods
+from .sqlite_file import SQLiteFile
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    date TEXT NOT NULL,
+    type TEXT NOT NULL,
+    account TEXT NOT NULL,
+    counterparty TEXT,
+    currency TEXT NOT NULL DEFAULT 'USD',
+    amount REAL NOT NULL,
+    category TEXT NOT NULL,
+    description TEXT,
+    meta TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_transactions_account ON transactions (account, id);
+CREATE INDEX IF NOT EXISTS ix_transactions_category ON transactions (category, id);
+CREATE INDEX IF NOT EXISTS ix_transactions_account_category ON transactions (account, category, id);
+CREATE INDEX IF NOT EXISTS ix_transactions_date ON transactions (date, id);
+
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    platform TEXT NOT NULL,
+    external_id TEXT,
+    name TEXT NOT NULL,
+    objective TEXT,
+    status TEXT,
+    budget_daily REAL,
+    start_date TEXT,
+    end_date TEXT,
+    targeting TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_campaigns_platform ON campaigns (platform, id);
+
+CREATE TABLE IF NOT EXISTS metrics (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    campaign_id INTEGER,
+    date TEXT NOT NULL,
+    impressions INTEGER NOT NULL DEFAULT 0,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    spend REAL NOT NULL DEFAULT 0,
+    conversions INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    metrics TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_metrics_campaign ON metrics (campaign_id, date, id);
+CREATE INDEX IF NOT EXISTS ix_metrics_date ON metrics (date, id);
+
+CREATE TABLE IF NOT EXISTS insights (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    topic TEXT NOT NULL,
+    summary TEXT,
+    score INTEGER NOT NULL DEFAULT 0,
+    data TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS suggestions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    tags TEXT,
+    created_at TEXT NOT NULL
+);
+
+-- Running totals per day and month; metrics without a campaign are totalled under a NULL campaign_id
+CREATE TABLE IF NOT EXISTS metric_rollups (
+    grain TEXT NOT NULL,
+    period TEXT NOT NULL,
+    campaign_id INTEGER,
+    impressions INTEGER NOT NULL DEFAULT 0,
+    clicks INTEGER NOT NULL DEFAULT 0,
+    spend REAL NOT NULL DEFAULT 0,
+    conversions INTEGER NOT NULL DEFAULT 0,
+    revenue REAL NOT NULL DEFAULT 0,
+    row_count INTEGER NOT NULL DEFAULT 0
+);
+-- NULLs are distinct in a plain unique index, so NULL and 0 are told apart by the IS NULL term
+CREATE UNIQUE INDEX IF NOT EXISTS ux_metric_rollups ON metric_rollups
+    (grain, period, campaign_id IS NULL, COALESCE(campaign_id, 0));
+CREATE INDEX IF NOT EXISTS ix_metric_rollups_campaign ON metric_rollups (campaign_id, grain, period);
+
+CREATE TABLE IF NOT EXISTS transaction_rollups (
+    grain TEXT NOT NULL,
+    period TEXT NOT NULL,
+    account TEXT NOT NULL,
+    category TEXT NOT NULL,
+    currency TEXT NOT NULL,
+    amount REAL NOT NULL DEFAULT 0,
+    row_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (grain, period, account, category, currency)
+) WITHOUT ROWID;
+"""
+
+# Upsert target of each rollup table: its primary key or unique index
+ROLLUP_CONFLICT = {
+    'metric_rollups': "grain, period, campaign_id IS NULL, COALESCE(campaign_id, 0)",
+    'transaction_rollups': "grain, period, account, category, currency"
+}
+
+# Group key expression of each metrics aggregation, over daily rollups r LEFT JOIN campaigns c
+METRIC_GROUPS = {
+    'campaign': "r.campaign_id",
+    'platform': "c.platform",
+    'day': "r.period",
+    # Monday of the ISO week
+    'week': "date(r.period, 'weekday 0', '-6 days')",
+    'month': "substr(r.period, 1, 7)"
+}
+
+class SQLiteStorage:
+    """SQLite storage backend shared by every worker process
+
+    Ids count up from 1 in each collection (one AUTOINCREMENT column per
+    table) and are never reused, as in the memory backend.
+    """
+
+    # Column layout of each collection, in API field order
+    COLUMNS = {
+        'transactions': ('date', 'type', 'account', 'counterparty', 'currency', 'amount', 'category', 'description', 'meta'),
+        'campaigns': ('platform', 'external_id', 'name', 'objective', 'status', 'budget_daily', 'start_date', 'end_date', 'targeting'),
+        'metrics': ('campaign_id', 'date', 'impressions', 'clicks', 'spend', 'conversions', 'revenue', 'metrics'),
+        'insights': ('topic', 'summary', 'score', 'data'),
+        'suggestions': ('title', 'body', 'tags')
+    }
+
+    # Columns holding nested objects, stored as JSON text
+    JSON_COLUMNS = {
+        'transactions': ('meta',),
+        'campaigns': ('targeting',),
+        'metrics': ('metrics',),
+        'insights': ('data',),
+        'suggestions': ()
+    }
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = SQLiteFile(path, setup=self._ensure_schema)
+        self.in_memory = self.db.in_memory
+        self._schema_lock = threading.Lock()
+        self._schema_ready = False
+        self._sql = {}
+        self._keepalive = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """This thread's connection, with tables and rollups in place"""
+        return self.db.conn
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        """Create tables and indexes once per process"""
+        with self._schema_lock:
+            if self._schema_ready:
+                return
+            with self.db.write(conn):
+                old = conn.execute("SELECT sql FROM sqlite_master WHERE name = 'metric_rollups'").fetchone()
+                if old and 'WITHOUT ROWID' in old[0]:
+                    # Created when campaign_id 0 stood for "no campaign"; refilled from the metrics below
+                    conn.execute("DROP TABLE metric_rollups")
+            conn.executescript(SCHEMA)
+            # Databases created before rollups existed get them filled once
+            for collection, spec in ROLLUPS.items():
+                if (conn.execute(f"SELECT EXISTS (SELECT 1 FROM {collection})").fetchone()[0]
+                        and not conn.execute(f"SELECT EXISTS (SELECT 1 FROM {spec['table']})").fetchone()[0]):
+                    with self.db.write(conn):
+                        self._rebuild_rollups(conn, collection)
+            if self.in_memory:
+                # Keep the shared in-memory database alive for the process lifetime
+                self._keepalive = conn
+            self._schema_ready = True
+
+    def _insert_sql(self, collection: str) -> str:
+        key = ('insert', collection)
+        if key not in self._sql:
+            columns = self.COLUMNS[collection] + ('created_at',)
+            self._sql[key] = (f"INSERT INTO {collection} ({', '.join(columns)}) "
+                              f"VALUES ({', '.join('?' for _ in columns)})")
+        return self._sql[key]
+
+    def _select_sql(self, collection: str, fields: tuple, keyset: bool) -> str:
+        # SQL text is kept stable per filter combination so sqlite3's
+        # statement cache can reuse the prepared statement
+        key = ('select', collection, fields, keyset)
+        if key not in self._sql:
+            order_by = ORDER_BY[collection]
+            conditions = [f"{f} = ?" for f in fields]
+            if keyset:
+                # Row-value comparison lets the (..., date, id) indexes seek straight to the page
+                conditions.append(f"({', '.join(order_by)}) < ({', '.join('?' for _ in order_by)})")
+            where = " AND ".join(conditions)
+            order = ", ".join(f"{c} DESC" for c in order_by)
+            columns = ', '.join(self._fields(collection))
+            self._sql[key] = (f"SELECT {columns} FROM {collection}"
+                              f"{' WHERE ' + where if where else ''} ORDER BY {order} LIMIT ?")
+        return self._sql[key]
+
+    def _fields(self, collection: str) -> tuple:
+        return ('id',) + self.COLUMNS[collection] + ('created_at',)
+
+    def _encode(self, collection: str, row: Dict[str, Any]) -> list:
+        json_columns = self.JSON_COLUMNS[collection]
+        values = []
+        for c in self.COLUMNS[collection]:
+            value = row.get(c)
+            if c in json_columns:
+                value = json.dumps(value)
+            elif isinstance(value, (dict, list)):
+                # Nested values in free-form columns are kept as JSON BLOBs, which
+                # can't be mistaken for text stored there, like the memory backend keeps them
+                value = json.dumps(value).encode()
+            values.append(value)
+        return values
+
+    def _decode(self, collection: str, row: tuple) -> Dict[str, Any]:
+        record = dict(zip(self._fields(collection), row))
+        for c in self.JSON_COLUMNS[collection]:
+            if record[c] is not None:
+                record[c] = json.loads(record[c])
+        for c, value in record.items():
+            if type(value) is bytes:
+                record[c] = json.loads(value)
+        return record
+
+    def _rollup_sql(self, collection: str) -> str:
+        key = ('rollup', collection)
+        if key not in self._sql:
+            spec = ROLLUPS[collection]
+            columns = ('grain', 'period') + spec['keys'] + spec['sums']
+            updates = ", ".join(f"{c} = {c} + excluded.{c}" for c in spec['sums'])
+            self._sql[key] = (f"INSERT INTO {spec['table']} ({', '.join(columns)}, row_count) "
+                              f"VALUES ({', '.join('?' for _ in columns)}, 1) "
+                              f"ON CONFLICT ({ROLLUP_CONFLICT[spec['table']]}) "
+                              f"DO UPDATE SET {updates}, row_count = row_count + 1")
+        return self._sql[key]
+
+    def _update_rollups(self, conn: sqlite3.Connection, collection: str, row: Dict[str, Any]):
+        """Add one row to its daily and monthly totals, inside the caller's transaction"""
+        if collection not in ROLLUPS:
+            return
+        spec = ROLLUPS[collection]
+        values = [row.get(k) for k in spec['keys']] + [row.get(c) or 0 for c in spec['sums']]
+        for grain, period in rollup_periods(row):
+            conn.execute(self._rollup_sql(collection), [grain, period] + values)
+
+    def _rebuild_rollups(self, conn: sqlite3.Connection, collection: str):
+        spec = ROLLUPS[collection]
+        keys = spec['keys']
+        conn.execute(f"DELETE FROM {spec['table']}")
+        for grain, width in GRAINS.items():
+            conn.execute(
+                f"INSERT INTO {spec['table']} (grain, period, {', '.join(keys + spec['sums'])}, row_count) "
+                f"SELECT ?, substr(date, 1, {width}), {', '.join(keys)}, "
+                f"{', '.join(f'SUM({c})' for c in spec['sums'])}, COUNT(*) "
+                f"FROM {collection} GROUP BY 2, {', '.join(str(i + 3) for i in range(len(keys)))}",
+                [grain]
+            )
+
+    def rebuild_rollups(self) -> Dict[str, int]:
+        """Recompute every rollup table from the raw rows"""
+        conn = self.conn
+        counts = {}
+        with self.db.write(conn):
+            for collection, spec in ROLLUPS.items():
+                self._rebuild_rollups(conn, collection)
+                counts[collection] = conn.execute(f"SELECT COUNT(*) FROM {spec['table']}").fetchone()[0]
+        return counts
+
+    def rollups(self, collection: str, grain: str, filters: Optional[Dict[str, Any]] = None,
+                date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Read running totals of one grain, oldest period first"""
+        spec = ROLLUPS[collection]
+        width = GRAINS[grain]
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        conditions = ["grain = ?"] + [f"{f} = ?" for f in sorted(filters)]
+        params = [grain] + [filters[f] for f in sorted(filters)]
+        if date_from:
+            conditions.append("period >= ?")
+            params.append(date_from[:width])
+        if date_to:
+            conditions.append("period <= ?")
+            params.append(date_to[:width])
+
+        fields = ('period',) + spec['keys'] + spec['sums'] + ('row_count',)
+        sql = (f"SELECT {', '.join(fields)} FROM {spec['table']} WHERE {' AND '.join(conditions)} "
+               f"ORDER BY period, {', '.join(spec['keys'])}")
+        return [{'grain': grain, **dict(zip(fields[:-1], r[:-1])), 'rows': r[-1]}
+                for r in self.conn.execute(sql, params)]
+
+    def insert(self, collection: str, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a row and return it with its id and creation timestamp"""
+        created_at = datetime.now().isoformat()
+        conn = self.conn
+        with self.db.write(conn):
+            cursor = conn.execute(self._insert_sql(collection), self._encode(collection, row) + [created_at])
+            self._update_rollups(conn, collection, row)
+        return {"id": cursor.lastrowid, **row, "created_at": created_at}
+
+    def insert_many(self, collection: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store many rows in a single transaction"""
+        created_at = datetime.now().isoformat()
+        sql = self._insert_sql(collection)
+        conn = self.conn
+        ids = []
+        with self.db.write(conn):
+            for row in rows:
+                ids.append(conn.execute(sql, self._encode(collection, row) + [created_at]).lastrowid)
+                self._update_rollups(conn, collection, row)
+        return [{"id": i, **row, "created_at": created_at} for i, row in zip(ids, rows)]
+
+    def list(self, collection: str, filters: Optional[Dict[str, Any]] = None, limit: int = 200,
+             after: Optional[tuple] = None) -> List[Dict[str, Any]]:
+        """Return the newest rows of a collection matching all equality filters
+
+        ``after`` is an order key from a cursor; only rows ordered before it are returned.
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        fields = tuple(sorted(filters))
+        params = [filters[f] for f in fields] + list(after or ()) + [limit]
+        rows = self.conn.execute(self._select_sql(collection, fields, after is not None), params).fetchall()
+        return [self._decode(collection, r) for r in rows]
+
+    def aggregate_metrics(self, group_by: str, filters: Optional[Dict[str, Any]] = None,
+                          date_from: Optional[str] = None, date_to: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Sum metric counters per group from the daily rollups"""
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        conditions = ["r.grain = 'day'"] + [f"r.{f} = ?" for f in sorted(filters)]
+        params = [filters[f] for f in sorted(filters)]
+        if date_from:
+            conditions.append("r.period >= ?")
+            params.append(date_from[:10])
+        if date_to:
+            conditions.append("r.period <= ?")
+            params.append(date_to[:10])
+
+        key = METRIC_GROUPS[group_by]
+        join = " LEFT JOIN campaigns c ON c.id = r.campaign_id" if group_by == 'platform' else ""
+        sql = (f"SELECT {key} AS key, SUM(r.impressions), SUM(r.clicks), SUM(r.spend), "
+               f"SUM(r.conversions), SUM(r.revenue), SUM(r.row_count) "
+               f"FROM metric_rollups r{join} WHERE {' AND '.join(conditions)} GROUP BY key ORDER BY key")
+
+        fields = ('key', 'impressions', 'clicks', 'spend', 'conversions', 'revenue', 'rows')
+        return [dict(zip(fields, r)) for r in self.conn.execute(sql, params)]
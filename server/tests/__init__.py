@@ -0,0 +1 @@
+# Stress tests and benchmarks; run from server/ as `python -m tests.<name>`
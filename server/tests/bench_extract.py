@@ -0,0 +1,117 @@
+"""HTML extraction throughput and memory: the streaming extractors against the old BeautifulSoup path
+
+The old run_scrape parsed the whole page with BeautifulSoup's html.parser
+and joined every p/li/h* before cutting the text to 2000 characters. This
+times that against extract_page with lxml and with its BeautifulSoup
+fallback, and records each one's peak traced memory. The fixtures are
+generated pages shaped like a long article and a reference manual; pass
+saved real-world pages with ``--html``. Exits non-zero if the extractors
+disagree with the old path on title, description or text.
+
+    cd server && python -m tests.bench_extract [--html page.html ...]
+"""
+import argparse
+import contextlib
+import gc
+import io
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+def old_extract(html: str) -> dict:
+    """Extraction as run_scrape did it before the streaming extractors"""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    title = soup.title.string if soup.title else ""
+    text_elements = soup.find_all(['p', 'li', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+    text = " ".join([elem.get_text(' ', strip=True) for elem in text_elements if elem.get_text(strip=True)])[:2000]
+    meta_desc = soup.find('meta', attrs={'name': 'description'})
+    description = meta_desc.get('content', '') if meta_desc else ""
+    return {"title": title, "description": description, "extract": text}
+
+def words(rng: random.Random, n: int) -> str:
+    vocabulary = ("cotton export market price tonne freight Cairo Alexandria olive dates growth quarter "
+                  "ministry shipment buyer supplier contract season harvest demand").split()
+    return ' '.join(rng.choice(vocabulary) for _ in range(n))
+
+def article(rng: random.Random, sections: int) -> str:
+    """A news or blog page: heavy head, navigation, a long body, comments and footer scripts"""
+    nav = ''.join(f'<li><a href="/section/{i}">{words(rng, 2)}</a></li>' for i in range(60))
+    body = ''.join(f'<h2>{words(rng, 5)}</h2>' + ''.join(f'<p>{words(rng, 80)} <a href="/p/{s}/{i}">more</a> '
+                                                         f'<b>{words(rng, 3)}</b> {words(rng, 40)}</p>' for i in range(6))
+                   + f'<figure><img src="/i/{s}.jpg"><figcaption>{words(rng, 8)}</figcaption></figure>'
+                   for s in range(sections))
+    comments = ''.join(f'<div class="comment"><span>{words(rng, 2)}</span><p>{words(rng, 30)}</p></div>'
+                       for _ in range(sections * 4))
+    scripts = ''.join(f'<script>window.__data{i} = {{"k": "{words(rng, 50)}"}};</script>' for i in range(40))
+    return (f'<!DOCTYPE html><html><head><meta charset="utf-8"><title>{words(rng, 8)}</title>'
+            f'<meta name="description" content="{words(rng, 20)}"><style>{".c{color:red}" * 2000}</style>{scripts}</head>'
+            f'<body><header><nav><ul>{nav}</ul></nav></header><main><article><h1>{words(rng, 8)}</h1>{body}</article>'
+            f'<section class="comments">{comments}</section></main><footer>{scripts}</footer></body></html>')
+
+def manual(rng: random.Random, pages: int) -> str:
+    """A one-page reference manual: sidebar table of contents, tables and code blocks"""
+    toc = ''.join(f'<li><a href="#s{i}">{words(rng, 3)}</a></li>' for i in range(pages * 5))
+    body = ''.join(f'<h3 id="s{i}">{words(rng, 4)}</h3><p>{words(rng, 60)}</p>'
+                   f'<pre><code>{words(rng, 40)}</code></pre><table>'
+                   + ''.join(f'<tr><td>{words(rng, 2)}</td><td>{words(rng, 10)}</td></tr>' for _ in range(8))
+                   + '</table><ul>' + ''.join(f'<li>{words(rng, 12)}</li>' for _ in range(5)) + '</ul>'
+                   for i in range(pages * 5))
+    return (f'<html><head><title>{words(rng, 4)} manual</title></head><body><div class="sidebar"><ol>{toc}</ol></div>'
+            f'<div class="content">{body}</div></body></html>')
+
+def measure(fn, html: str) -> tuple:
+    """(best seconds of 3 runs, peak traced bytes, result)"""
+    best = float('inf')
+    for _ in range(3):
+        started = time.perf_counter()
+        result = fn(html)
+        best = min(best, time.perf_counter() - started)
+    gc.collect()
+    tracemalloc.start()
+    fn(html)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak, result
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--html', nargs='*', default=[], help='saved pages to add to the generated fixtures')
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        from config.settings import Config
+        from services import scraper
+
+    def new_extract(engine: str):
+        def extract(html: str) -> dict:
+            Config.SCRAPE_EXTRACTOR = engine
+            return scraper.extract_page(html, 'http://example.com/')[0]
+        return extract
+
+    rng = random.Random(1)
+    fixtures = {'short article': article(rng, 12), 'long article': article(rng, 120), 'manual': manual(rng, 300)}
+    for path in args.html:
+        with open(path, encoding='utf-8', errors='replace') as f:
+            fixtures[os.path.basename(path)] = f.read()
+
+    paths = {'old bs4': old_extract, 'lxml': new_extract('lxml'), 'bs4 stream': new_extract('bs4')}
+    ok = True
+    print(f"{'fixture':18} {'size':>8}  " + '  '.join(f"{name:>28}" for name in paths))
+    for name, html in fixtures.items():
+        size = len(html.encode())
+        cells, results = [], {}
+        for path_name, fn in paths.items():
+            seconds, peak, results[path_name] = measure(fn, html)
+            cells.append(f"{seconds * 1000:8.1f} ms {size / 1e6 / seconds:7.1f} MB/s {peak / 1e6:6.1f} MB")
+        same = all(result == results['old bs4'] for result in results.values())
+        ok = ok and same
+        print(f"{name:18} {size / 1e6:6.2f}MB  " + '  '.join(cells) + ('' if same else '  RESULTS DIFFER'))
+    print('columns: best time, throughput, peak traced memory')
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,64 @@
+"""Filtered listings: secondary indexes against a full scan
+
+Loads transactions into MemoryStorage and, as the controller kept them
+before indexes existed, into a plain list of dicts. Then it times the same
+filtered page (newest 200 matches) both ways. Index lookups cost about the
+result size, scans the table size. Exits non-zero if the results differ.
+
+    cd server && python -m tests.bench_filters [--rows 1000000]
+"""
+import argparse
+import sys
+import time
+from storage import MemoryStorage
+
+def transaction(i: int) -> dict:
+    return {"date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "type": ("expense", "income")[i % 2],
+            "account": f"acct-{i % 50}", "counterparty": f"vendor-{i % 300}", "currency": "USD",
+            "amount": float(i % 9973), "category": f"cat-{i % 20}", "description": None, "meta": {}}
+
+def scan(rows: list, filters: dict, limit: int) -> list:
+    """The pre-index path: filter every row, then take the newest ``limit``"""
+    for field, value in filters.items():
+        rows = [r for r in rows if r[field] == value]
+    return rows[::-1][:limit]
+
+def timed(fn, repeat: int) -> tuple:
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return result, best * 1000
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    storage = MemoryStorage()
+    plain = []
+    for start in range(0, args.rows, 10_000):
+        batch = [transaction(i) for i in range(start, min(args.rows, start + 10_000))]
+        plain.extend(storage.insert_many('transactions', batch))
+    print(f"{args.rows} transactions")
+
+    ok = True
+    cases = {
+        'account (2% of rows)': {'account': 'acct-7'},
+        'account + category': {'account': 'acct-7', 'category': 'cat-7'},
+        'category, no match': {'category': 'cat-99'},
+        'no filter': {},
+    }
+    for name, filters in cases.items():
+        indexed, indexed_ms = timed(lambda: storage.list('transactions', filters, 200), args.repeat)
+        scanned, scan_ms = timed(lambda: scan(plain, filters, 200), args.repeat)
+        same = [r['id'] for r in indexed] == [r['id'] for r in scanned]
+        ok = ok and same
+        print(f"  {name:22} {len(indexed):4} rows: index {indexed_ms:8.3f} ms, scan {scan_ms:8.1f} ms "
+              f"({scan_ms / max(indexed_ms, 1e-6):,.0f}x){'' if same else '  RESULTS DIFFER'}")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
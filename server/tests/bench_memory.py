@@ -0,0 +1,87 @@
+"""Resident memory of stored rows: columnar tables against dicts per row
+
+Each layout is loaded in a fresh process so their heaps don't mix. The
+baseline keeps rows as the controller used to: one dict per row with an ISO
+``created_at`` string. Only the rows are compared; MemoryStorage's indexes
+and rollups come on top of either layout. Exits non-zero if the columnar layout does not use
+at least ``--min-ratio`` times less memory.
+
+    cd server && python -m tests.bench_memory [--rows 1000000] [--min-ratio 5]
+"""
+import argparse
+import gc
+import os
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+def transaction(i: int) -> dict:
+    return {"date": f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}", "type": ("expense", "income")[i % 2],
+            "account": f"acct-{i % 50}", "counterparty": f"vendor-{i % 300}", "currency": ("USD", "EUR")[i % 2],
+            "amount": float(i % 9973) / 7, "category": f"cat-{i % 20}",
+            "description": None if i % 3 else f"Invoice {i}", "meta": {}}
+
+def metric(i: int) -> dict:
+    # Metrics arrive day by day, 3000 campaign rows a day
+    return {"campaign_id": i % 500 or None, "date": (date(2025, 1, 1) + timedelta(days=i // 3000)).isoformat(),
+            "impressions": i % 100000, "clicks": i % 3000, "spend": (i % 50000) / 3, "conversions": i % 40,
+            "revenue": (i % 70000) / 3, "metrics": {}}
+
+ROWS = {'transactions': transaction, 'metrics': metric}
+
+def rss() -> int:
+    """Resident set size in bytes"""
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def load(layout: str, collection: str, rows: int):
+    """Run in a child process: store ``rows`` rows and print bytes used and seconds taken"""
+    build = ROWS[collection]
+    if layout == 'columns':
+        from storage import ColumnTable, MemoryStorage
+        store = ColumnTable(MemoryStorage.COLUMNS[collection])
+    else:
+        store = []
+    gc.collect()
+    base = rss()
+    started = time.perf_counter()
+    for start in range(0, rows, 1000):
+        batch = [build(i) for i in range(start, min(rows, start + 1000))]
+        if layout == 'columns':
+            for n, row in enumerate(batch):
+                store.append(start + n + 1, row, datetime.now())
+        else:
+            store.extend({**row, "id": start + n + 1, "created_at": datetime.now().isoformat()}
+                         for n, row in enumerate(batch))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    print(rss() - base, elapsed)
+
+def measure(layout: str, collection: str, rows: int) -> tuple:
+    output = subprocess.run([sys.executable, '-m', 'tests.bench_memory', '--child', layout, collection, '--rows', str(rows)],
+                            check=True, capture_output=True, text=True).stdout.split()
+    return int(output[0]), float(output[1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--min-ratio', type=float, default=5)
+    parser.add_argument('--child', nargs=2, metavar=('LAYOUT', 'COLLECTION'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        load(*args.child, args.rows)
+        return 0
+
+    ok = True
+    for collection in ROWS:
+        dicts, dicts_s = measure('dicts', collection, args.rows)
+        columns, columns_s = measure('columns', collection, args.rows)
+        ratio = dicts / max(columns, 1)
+        ok = ok and ratio >= args.min_ratio
+        print(f"{collection:12} {args.rows} rows: dicts {dicts / 2**20:7.1f} MiB ({dicts / args.rows:4.0f} B/row, {dicts_s:.1f}s), "
+              f"columns {columns / 2**20:6.1f} MiB ({columns / args.rows:4.0f} B/row, {columns_s:.1f}s) -> {ratio:.1f}x smaller")
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
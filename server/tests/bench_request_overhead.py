@@ -0,0 +1,64 @@
+"""Per-request agent routing cost: a new AgentService per request against the shared one
+
+Times routing a set of prompts with an AgentService built for every call,
+as run_agent used to, and with the one create_app keeps. Then it checks
+that /api/agents/route builds no AgentService of its own. Runs offline
+(no OpenAI key). Exits non-zero if a request constructs a service.
+
+    cd server && python -m tests.bench_request_overhead [--number 1000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import timeit
+
+PROMPTS = ("find buyers for olive oil", "research the egyptian market", "scrape https://example.com",
+           "score this lead", "new invoice 42", "plan a google ads campaign", "hello there")
+
+def per_prompt_us(fn, number: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=5)) / (number * len(PROMPTS)) * 1e6
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ.update(OPENAI_API_KEY='', DATABASE_URL='memory://', SCRAPE_CACHE_PATH='')
+    with contextlib.redirect_stdout(io.StringIO()):
+        from services.agent_service import AgentService
+        from main import create_app
+        app = create_app()
+
+    built = per_prompt_us(lambda: [AgentService().smart_route(p) for p in PROMPTS], args.number)
+    shared = app.extensions['agent_service']
+    reused = per_prompt_us(lambda: [shared.smart_route(p) for p in PROMPTS], args.number)
+    print(f"new AgentService per request: {built:8.2f} us per routed prompt")
+    print(f"shared AgentService:          {reused:8.2f} us per routed prompt ({built / reused:.0f}x less)")
+
+    constructed = []
+    original_init = AgentService.__init__
+
+    def counting_init(self, *args, **kwargs):
+        constructed.append(self)
+        original_init(self, *args, **kwargs)
+
+    AgentService.__init__ = counting_init
+    try:
+        client = app.test_client()
+        # Agents that answer without OpenAI or the network
+        requests = [{"prompt": p} for p in ("new invoice 42", "plan a google ads campaign")] * 100
+        timer = timeit.default_timer()
+        ok = all(client.post('/api/agents/route', json=body).status_code == 200 for body in requests)
+        endpoint = (timeit.default_timer() - timer) / len(requests) * 1e6
+    finally:
+        AgentService.__init__ = original_init
+    print(f"/api/agents/route: {endpoint:.0f} us per request, {len(constructed)} AgentService built")
+
+    ok = ok and not constructed
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
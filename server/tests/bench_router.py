@@ -0,0 +1,89 @@
+"""Keyword routing of long scraped prompts: KeywordRouter against per-rule scans
+
+The old smart_route lowercased the prompt and ran ``any(k in low ...)`` once
+per rule. This times that against KeywordRouter for the built-in rules and
+for a large rule table like one loaded from AGENT_ROUTES (where the router
+switches to one compiled regex), and times the one-regex scan on both tables
+so the switch point can be checked. Every prompt must route to the same
+agent every way, including a few hundred random ones. Exits non-zero
+otherwise.
+
+    cd server && python -m tests.bench_router
+"""
+import argparse
+import random
+import sys
+import timeit
+from services.agent_router import KeywordRouter
+from services.agent_service import AgentService
+
+FILLER = ("Egyptian cotton exporters ship long staple cotton, olive oil and dates to Europe and the Gulf. "
+          "Prices per tonne rose this quarter while freight costs stayed flat; the ministry expects growth.").split()
+
+def per_rule_scan(rules):
+    """The pre-router smart_route over ``rules``"""
+    def route(prompt):
+        low = prompt.lower()
+        for agent, keywords in rules:
+            if any(k in low for k in keywords):
+                return agent
+        return None
+    return route
+
+class RegexRouter(KeywordRouter):
+    """KeywordRouter that always scans with its one compiled regex"""
+    REGEX_MIN_KEYWORDS = 0
+
+def scraped(rng: random.Random, words: int, tail: str = '') -> str:
+    return ' '.join(rng.choice(FILLER) for _ in range(words)) + tail
+
+def large_table(rng: random.Random) -> list:
+    """A dozen agents with 15 made-up keywords each, as AGENT_ROUTES might hold"""
+    return [(f'agent{a}', tuple(''.join(rng.choice('bcdfghjkmpqvwxz') for _ in range(rng.randint(4, 9)))
+                                for _ in range(15)))
+            for a in range(12)]
+
+def us(fn, prompt: str, number: int) -> float:
+    return min(timeit.repeat(lambda: fn(prompt), number=number, repeat=5)) / number * 1e6
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--number', type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    big = large_table(rng)
+    tables = {'built-in rules': AgentService.ROUTES, f'{sum(len(k) for _, k in big)}-keyword table': big}
+    late_keyword = big[-1][1][0]
+    cases = [("short prompt", "plan a google ads campaign for spring"),
+             ("2KB scraped, no keyword", scraped(rng, 300)),
+             ("10KB scraped, no keyword", scraped(rng, 1500)),
+             ("10KB scraped, keyword at end", scraped(rng, 1500, f' new campaign {late_keyword}')),
+             ("10KB scraped, url + lead at end", 'see https://x.io ' + scraped(rng, 1500, ' buyer'))]
+
+    ok = True
+    for table_name, rules in tables.items():
+        old, router, regex = per_rule_scan(rules), KeywordRouter(rules), RegexRouter(rules)
+        mode = 'regex' if router._pattern is not None else 'keyword list'
+        print(f"{table_name} ({mode}): us per prompt, per-rule scans -> KeywordRouter [one regex]")
+        for name, prompt in cases:
+            same = old(prompt) == router.route(prompt) == regex.route(prompt)
+            ok = ok and same
+            before, after = us(old, prompt, args.number), us(router.route, prompt, args.number)
+            scan = us(regex.route, prompt, args.number)
+            print(f"  {name:32} {len(prompt):6} chars {before:8.1f} -> {after:7.1f} ({before / after:4.1f}x)"
+                  f" [{scan:7.1f}]{'' if same else '  ROUTES DIFFER'}")
+
+        keywords = [k for _, ks in rules for k in ks]
+        for _ in range(300):
+            prompt = ' '.join(rng.choice(FILLER + keywords) if rng.random() < 0.1 else rng.choice(FILLER)
+                              for _ in range(rng.randint(1, 60)))
+            if not old(prompt) == router.route(prompt) == regex.route(prompt):
+                print(f"  ROUTES DIFFER for {prompt!r}")
+                ok = False
+
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+"""Crawl mode of the scrape agent against a local fixture site
+
+Pages of the fixture link to their children, to themselves with a fragment
+or reordered query, to another host and to a missing page. Checks that:
+
+- every canonical URL is fetched once;
+- seed + depth follows links to the requested depth;
+- no host sees more than SCRAPE_PER_HOST_LIMIT requests at once, nor
+  requests closer than SCRAPE_POLITENESS_DELAY;
+- the concurrent crawl beats fetching the same pages one by one.
+
+Runs offline and exits non-zero on failure.
+
+    cd server && python -m tests.check_crawl [--page-delay 0.2]
+"""
+import argparse
+import collections
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class FixtureSite(BaseHTTPRequestHandler):
+    """Page n links to pages 2n+1 and 2n+2; the handler records per-host concurrency"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    lock = threading.Lock()
+    delay = 0.2
+    active = collections.Counter()
+    peak = collections.Counter()
+    starts = collections.defaultdict(list)
+    hits = collections.Counter()
+
+    @classmethod
+    def reset(cls):
+        for counter in (cls.active, cls.peak, cls.starts, cls.hits):
+            counter.clear()
+
+    def do_GET(self):
+        host = self.headers['Host']
+        with FixtureSite.lock:
+            FixtureSite.active[host] += 1
+            FixtureSite.peak[host] = max(FixtureSite.peak[host], FixtureSite.active[host])
+            FixtureSite.starts[host].append(time.monotonic())
+            FixtureSite.hits[host, self.path] += 1
+        time.sleep(FixtureSite.delay)
+
+        page = self.path.lstrip('/').split('?')[0]
+        if page.isdigit():
+            n = int(page)
+            links = (f'<a href="/{2 * n + 1}">a</a><a href="{2 * n + 2}#x">b</a><a href="#top">self</a>'
+                     f'<a href="/{n}?b=2&a=1">q</a><a href="/{n}?a=1&b=2">q2</a>'
+                     f'<a href="http://example.invalid/">out</a><a href="mailto:x@y">m</a><a href="/nope">404</a>')
+            body = (f'<html><head><title>Page {n}</title><meta name="description" content="d{n}"></head>'
+                    f'<body><h1>H{n}</h1><p>text {n}</p>{links}</body></html>').encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html')
+        else:
+            body = b'missing'
+            self.send_response(404)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with FixtureSite.lock:
+            FixtureSite.active[host] -= 1
+
+    def log_message(self, *args):
+        pass
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--page-delay', type=float, default=0.2, help='seconds the fixture takes per page')
+    args = parser.parse_args()
+    FixtureSite.delay = args.page_delay
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureSite)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_port
+
+    os.environ['SCRAPE_CACHE_PATH'] = ''
+    with contextlib.redirect_stdout(io.StringIO()):
+        from config.settings import Config
+        from services.agent_service import AgentService
+    agent = AgentService()
+    checks = []
+
+    def check(name: str, passed: bool, detail: str = ''):
+        checks.append(passed)
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+    def crawl(params: dict) -> tuple:
+        FixtureSite.reset()
+        started = time.perf_counter()
+        result = agent.run_scrape('scrape these', params)
+        return result, time.perf_counter() - started
+
+    # Two hosts, with duplicates that differ only in host case, fragment or repetition
+    urls = ([f"http://127.0.0.1:{port}/{i}" for i in range(6)] + [f"http://LOCALHOST:{port}/{i}#frag" for i in range(6)]
+            + [f"http://127.0.0.1:{port}/0"])
+    result, elapsed = crawl({"urls": urls})
+    first = result['pages'][0]
+    check("many URLs", result['page_count'] == 12 and not result['failed'], f"{result['page_count']} pages in {elapsed:.2f}s")
+    check("each canonical URL fetched once", set(FixtureSite.hits.values()) == {1})
+    check("extracts title, description and text", (first['title'], first['description'], first['extract']) == ('Page 0', 'd0', 'H0 text 0'))
+    check(f"at most {Config.SCRAPE_PER_HOST_LIMIT} requests per host at once",
+          max(FixtureSite.peak.values()) <= Config.SCRAPE_PER_HOST_LIMIT, str(dict(FixtureSite.peak)))
+    gap = min(b - a for starts in FixtureSite.starts.values() for a, b in zip(starts, starts[1:]))
+    check(f"requests to a host {Config.SCRAPE_POLITENESS_DELAY}s apart", gap >= Config.SCRAPE_POLITENESS_DELAY * 0.9,
+          f"closest {gap:.3f}s")
+
+    result, elapsed = crawl({"url": f"http://127.0.0.1:{port}/0", "depth": 2})
+    found = {(p['url'].rsplit('/', 1)[1], p['depth']) for p in result['pages']}
+    expected = ({('0', 0)} | {(page, 1) for page in ('1', '2', '0?a=1&b=2', 'nope')}
+                | {(page, 2) for page in ('3', '4', '5', '6', '1?a=1&b=2', '2?a=1&b=2')})
+    check("seed + depth 2 follows links", found == expected and set(FixtureSite.hits.values()) == {1},
+          f"{len(found)} pages in {elapsed:.2f}s")
+
+    Config.SCRAPE_POLITENESS_DELAY = 0
+    result, concurrent = crawl({"urls": urls})
+    started = time.perf_counter()
+    for url in urls[:12]:
+        agent.run_scrape(url, {})
+    serial = time.perf_counter() - started
+    check("concurrent crawl beats one page at a time", concurrent < serial / 2,
+          f"{concurrent:.2f}s vs {serial:.2f}s without politeness delay")
+
+    print('OK' if all(checks) else 'FAILED')
+    return 0 if all(checks) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,172 @@
+"""N8NService against a local fake n8n: pooling, retries and the circuit breaker
+
+The fake answers every call, failing with 503 or answering slowly on demand.
+Checks that:
+
+- calls share one kept-alive connection;
+- idempotent calls are retried through 5xx answers and timeouts, while
+  workflow executions and POST webhooks are not;
+- calls that never reached n8n are retried whatever their method;
+- the breaker opens after N8N_BREAKER_FAILURES failures and then fails
+  fast without calling n8n;
+- after the reset timeout one successful trial closes the breaker and one
+  failed trial opens it again;
+- GET /api/n8n/metrics reports the breaker state.
+
+Runs offline and exits non-zero on failure.
+
+    cd server && python -m tests.check_n8n
+"""
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Short timeouts so failure paths take seconds, set before the app reads its config
+os.environ.update(N8N_API_KEY='test', N8N_TIMEOUT_SECONDS='1', N8N_RETRY_BACKOFF='0.05', N8N_MAX_RETRIES='2',
+                  N8N_BREAKER_FAILURES='3', N8N_BREAKER_RESET_SECONDS='1', ENABLE_N8N_WORKFLOWS='true',
+                  DATABASE_URL='memory://')
+
+class FakeN8N(BaseHTTPRequestHandler):
+    """Answers 200, or 503 while ``down`` / for the next ``fail`` calls, after ``delay`` seconds"""
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    lock = threading.Lock()
+    hits = 0
+    ports = set()
+    fail = 0
+    down = False
+    delay = 0.0
+
+    @classmethod
+    def reset(cls, fail: int = 0, down: bool = False, delay: float = 0.0):
+        with cls.lock:
+            cls.hits, cls.ports, cls.fail, cls.down, cls.delay = 0, set(), fail, down, delay
+
+    def answer(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        with FakeN8N.lock:
+            FakeN8N.hits += 1
+            FakeN8N.ports.add(self.client_address[1])
+            failing = FakeN8N.down or FakeN8N.fail > 0
+            FakeN8N.fail -= 1
+        if FakeN8N.delay:
+            time.sleep(FakeN8N.delay)
+        body = json.dumps({"ok": not failing}).encode()
+        self.send_response(503 if failing else 200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = do_PUT = answer
+
+    def handle(self):
+        try:
+            super().handle()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client timed out before a slow answer was written
+            pass
+
+    def log_message(self, *args):
+        pass
+
+def main() -> int:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeN8N)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    from models.n8n_request import N8NWebhookRequest, N8NWorkflowRequest
+    from services.n8n_service import N8NService
+    checks = []
+
+    def check(name: str, passed: bool, detail: str = ''):
+        checks.append(passed)
+        print(f"{'ok  ' if passed else 'FAIL'} {name}{': ' + detail if detail else ''}")
+
+    def service(base_url: str = base) -> N8NService:
+        n8n = N8NService()
+        n8n.base_url = base_url
+        return n8n
+
+    n8n = service()
+    FakeN8N.reset()
+    started = time.perf_counter()
+    ok = all(n8n.get_workflow_status('1').success for _ in range(50))
+    per_call = (time.perf_counter() - started) * 1000 / 50
+    check("50 calls share one connection", ok and len(FakeN8N.ports) == 1,
+          f"{len(FakeN8N.ports)} connection(s), {per_call:.2f} ms per call")
+
+    n8n = service()
+    FakeN8N.reset(fail=2)
+    result = n8n.get_workflow_status('1')
+    check("GET retried through two 503s", result.success and FakeN8N.hits == 3, f"{n8n.metrics()['retries']} retries")
+
+    FakeN8N.reset(fail=1)
+    result = n8n.execute_workflow(N8NWorkflowRequest(workflow_id='1'))
+    check("workflow execution not retried on 503", result.status_code == 503 and FakeN8N.hits == 1)
+
+    n8n = service()
+    FakeN8N.reset(delay=1.5)
+    n8n.execute_webhook(N8NWebhookRequest(webhook_url=base + '/webhook/x'))
+    post_hits = FakeN8N.hits
+    FakeN8N.reset(delay=1.5)
+    n8n.execute_webhook(N8NWebhookRequest(webhook_url=base + '/webhook/x', method='put'))
+    check("timeouts retried for PUT webhooks, not POST", post_hits == 1 and FakeN8N.hits == 3,
+          f"POST {post_hits} call(s), PUT {FakeN8N.hits}")
+
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    closed_port = listener.getsockname()[1]
+    listener.close()
+    n8n = service(f'http://127.0.0.1:{closed_port}')
+    n8n.execute_workflow(N8NWorkflowRequest(workflow_id='1'))
+    check("refused connections retried even for POST", n8n.metrics()['upstream_calls'] == 3)
+
+    n8n = service()
+    FakeN8N.reset(delay=1.5)
+    for _ in range(3):
+        n8n.get_workflow_status('1')
+    FakeN8N.reset()
+    started = time.perf_counter()
+    results = [n8n.get_workflow_status('1') for _ in range(100)]
+    fast_ms = (time.perf_counter() - started) * 1000
+    check("breaker opens after 3 failures and fails fast",
+          n8n.breaker.stats()['state'] == 'open' and FakeN8N.hits == 0 and not any(r.success for r in results),
+          f"100 calls in {fast_ms:.1f} ms: {results[-1].body['error']}")
+
+    time.sleep(1.05)
+    FakeN8N.reset()
+    callers = [threading.Thread(target=n8n.get_workflow_status, args=('1',)) for _ in range(10)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+    check("successful trial closes the breaker", n8n.breaker.stats()['state'] == 'closed' and FakeN8N.hits >= 1,
+          f"{FakeN8N.hits} of 10 concurrent calls reached n8n")
+
+    n8n = service()
+    FakeN8N.reset(down=True)
+    for _ in range(3):
+        n8n.get_workflow_status('1')
+    time.sleep(1.05)
+    FakeN8N.reset(down=True)
+    n8n.get_workflow_status('1')
+    check("failed trial opens it again", n8n.breaker.stats()['state'] == 'open' and n8n.breaker.times_opened == 2,
+          f"the trial made {FakeN8N.hits} upstream call(s), with retries")
+
+    from main import create_app
+    metrics = create_app().test_client().get('/api/n8n/metrics').get_json()
+    check("GET /api/n8n/metrics reports the breaker", metrics['breaker']['state'] == 'closed',
+          json.dumps(metrics['breaker']))
+
+    print('OK' if all(checks) else 'FAILED')
+    return 0 if all(checks) else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
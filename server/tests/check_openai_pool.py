@@ -0,0 +1,53 @@
+"""Agent calls to OpenAI share kept-alive connections
+
+Routes prompts to every OpenAI-backed agent, one at a time and then from
+several threads, against a local stub. The stub must see no more
+connections than OPENAI_POOL_SIZE, and /api/agents/metrics must report the
+same reuse. Exits non-zero on failure.
+
+    cd server && python -m tests.check_openai_pool [--calls 200] [--threads 8]
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .openai_stub import OpenAIStub, start_stub, use_stub
+
+AGENTS = ('enrich', 'leadgen', 'research', 'default')
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8)
+    args = parser.parse_args()
+
+    use_stub(start_stub())
+    from config.settings import Config
+    from main import create_app
+    client = create_app().test_client()
+
+    def route(i: int) -> bool:
+        response = client.post('/api/agents/route', json={"prompt": f"find buyers for product {i}",
+                                                          "params": {"agent": AGENTS[i % len(AGENTS)]}})
+        return response.status_code == 200 and response.get_json()['ok']
+
+    started = time.perf_counter()
+    sequential = all(route(i) for i in range(args.calls // 4))
+    sequential_ms = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as pool:
+        concurrent = all(pool.map(route, range(args.calls)))
+    concurrent_ms = (time.perf_counter() - started) * 1000
+
+    http = client.get('/api/agents/metrics').get_json()['http']
+    print(f"{args.calls // 4} sequential calls in {sequential_ms:.0f} ms, "
+          f"{args.calls} calls from {args.threads} threads in {concurrent_ms:.0f} ms")
+    print(f"client: {http['requests']} requests over {http['connections']} connections ({http['reused']} reused); "
+          f"stub: {OpenAIStub.requests} requests over {OpenAIStub.connections} connections")
+    ok = (sequential and concurrent and http['requests'] == OpenAIStub.requests
+          and http['connections'] == OpenAIStub.connections <= Config.OPENAI_POOL_SIZE)
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""Streamed agent answers reach the client word by word
+
+Runs /api/agents/stream against a local OpenAI stub that takes
+``--word-delay`` seconds per word. The first token must arrive well before a
+non-streamed answer to the same prompt, and the tokens must add up to that
+answer. ``?cache=`` on the GET route must be read as a boolean. Exits
+non-zero on failure.
+
+    cd server && python -m tests.check_stream [--word-delay 0.05]
+"""
+import argparse
+import json
+import sys
+import time
+from .openai_stub import OpenAIStub, start_stub, use_stub
+
+PROMPT = "research the Egyptian date palm market"
+
+def read_events(client, method: str, url: str, **kwargs) -> list:
+    """(seconds since the request, event, data) for each server-sent event"""
+    started = time.perf_counter()
+    response = getattr(client, method)(url, buffered=False, **kwargs)
+    events, pending = [], ''
+    for chunk in response.response:
+        pending += chunk.decode() if isinstance(chunk, bytes) else chunk
+        while '\n\n' in pending:
+            block, pending = pending.split('\n\n', 1)
+            fields = dict(line.split(': ', 1) for line in block.splitlines())
+            events.append((time.perf_counter() - started, fields['event'], json.loads(fields['data'])))
+    response.close()
+    return events
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--word-delay', type=float, default=0.05)
+    args = parser.parse_args()
+
+    use_stub(start_stub())
+    OpenAIStub.word_delay = args.word_delay
+    from main import create_app
+    client = create_app().test_client()
+
+    started = time.perf_counter()
+    answer = client.post('/api/agents/route', json={"prompt": PROMPT}).get_json()['result']['ai_analysis']
+    whole_ms = (time.perf_counter() - started) * 1000
+
+    events = read_events(client, 'post', '/api/agents/stream', json={"prompt": PROMPT})
+    tokens = [(at, data['text']) for at, event, data in events if event == 'token']
+    first_ms, last_ms = tokens[0][0] * 1000, events[-1][0] * 1000
+    streamed = ''.join(text for _, text in tokens)
+    print(f"not streamed: {whole_ms:.0f} ms to the first byte")
+    print(f"streamed: first token {first_ms:.0f} ms, done {last_ms:.0f} ms, {len(tokens)} tokens")
+    ok = (events[0][1] == 'agent' and events[-1][1] == 'done' and len(tokens) > 1
+          and streamed == answer and first_ms < whole_ms / 2)
+
+    # With the default temperature completions are only cached when asked to
+    for value, upstream_calls in (('false', 2), ('true', 1)):
+        before = OpenAIStub.requests
+        for _ in range(2):
+            read_events(client, 'get', f'/api/agents/stream?prompt={PROMPT}&cache={value}')
+        calls = OpenAIStub.requests - before
+        print(f"GET ?cache={value} twice: {calls} upstream call(s)")
+        ok = ok and calls == upstream_calls
+
+    print('OK' if ok else 'FAILED')
+    return 0 if ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
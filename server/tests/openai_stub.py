@@ -0,0 +1,81 @@
+"""Local stand-in for the OpenAI chat completions API
+
+Answers every POST with a short completion, streamed as server-sent events
+when the request asks for ``stream``, and counts the TCP connections it
+accepted, so tests can tell whether clients reuse them.
+"""
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class OpenAIStub(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Replies go out at once rather than waiting on delayed ACKs
+    disable_nagle_algorithm = True
+
+    lock = threading.Lock()
+    connections = 0
+    requests = 0
+    # Seconds the "model" takes per word, whether the answer is streamed or not
+    word_delay = 0.0
+
+    def setup(self):
+        super().setup()
+        with OpenAIStub.lock:
+            OpenAIStub.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with OpenAIStub.lock:
+            OpenAIStub.requests += 1
+
+        words = f"stub answer about {body['messages'][-1]['content'][:40]}".split()
+        if body.get('stream'):
+            self._stream(words)
+            return
+
+        time.sleep(OpenAIStub.word_delay * len(words))
+        data = json.dumps({"choices": [{"message": {"content": ' '.join(words)}}],
+                           "usage": {"prompt_tokens": 10, "completion_tokens": len(words),
+                                     "total_tokens": 10 + len(words)},
+                           "model": body.get('model')}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, words):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send(event: dict):
+            data = f"data: {json.dumps(event) if event else '[DONE]'}\n\n".encode()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+        for i, word in enumerate(words):
+            time.sleep(OpenAIStub.word_delay)
+            send({"choices": [{"delta": {"content": word if i == 0 else ' ' + word}}]})
+        send({"choices": [], "usage": {"prompt_tokens": 10, "completion_tokens": len(words)}})
+        send(None)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, *args):
+        pass
+
+def start_stub() -> ThreadingHTTPServer:
+    """Serve the stub on a free local port from a daemon thread"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), OpenAIStub)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def use_stub(server: ThreadingHTTPServer):
+    """Point agents at the stub; call before importing the app, which reads its config once"""
+    os.environ.update(OPENAI_API_KEY='test', OPENAI_BASE_URL=f'http://127.0.0.1:{server.server_port}/v1',
+                      DATABASE_URL='memory://', ENABLE_AI_AGENTS='true')
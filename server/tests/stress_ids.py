@@ -0,0 +1,89 @@
+"""Concurrent writes must never hand out the same id twice
+
+Several processes, each running several threads, insert transactions (one
+at a time and in batches) into one SQLite file; then many threads do the same
+on the in-memory backend. Every id must be unique, every row listed, and the
+daily rollups must count every row. Ids are per collection on both backends,
+so a first campaign still gets id 1. Exits non-zero on failure.
+
+    cd server && python -m tests.stress_ids [--processes 4] [--threads 8] [--rows 200]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+from storage import SQLiteStorage, MemoryStorage
+
+ROW = {'type': 'expense', 'account': 'marketing', 'amount': 1.0, 'category': 'ads', 'currency': 'USD'}
+
+def hammer(storage, rows: int, ids: list):
+    """Insert ``rows`` writes' worth of transactions, with a listing now and then"""
+    for i in range(rows):
+        if i % 10 == 0:
+            batch = [{**ROW, 'date': '2025-01-01'}] * 5
+            ids.extend(r['id'] for r in storage.insert_many('transactions', batch))
+        else:
+            ids.append(storage.insert('transactions', {**ROW, 'date': f'2025-01-0{i % 9 + 1}'})['id'])
+        if i % 25 == 0:
+            storage.list('transactions', {'account': 'marketing'})
+
+def run_threads(storage, threads: int, rows: int) -> list:
+    ids = []
+    workers = [threading.Thread(target=hammer, args=(storage, rows, ids)) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return ids
+
+def worker_process(path: str, threads: int, rows: int, results):
+    results.put(run_threads(SQLiteStorage(path), threads, rows))
+
+def all_ids(storage) -> list:
+    """Every stored id, newest first, read through cursor pages"""
+    ids, after = [], None
+    while True:
+        page = storage.list('transactions', limit=1000, after=after)
+        ids += [r['id'] for r in page]
+        if len(page) < 1000:
+            return ids
+        after = (page[-1]['id'],)
+
+def check(backend: str, ids: list, storage) -> bool:
+    listed = all_ids(storage)
+    rolled = sum(r['rows'] for r in storage.rollups('transactions', 'day'))
+    campaign = storage.insert('campaigns', {'platform': 'meta', 'name': 'first'})['id']
+    ok = (len(set(ids)) == len(ids) == len(listed) == rolled and sorted(ids) == sorted(listed)
+          and campaign == 1)
+    print(f"{backend}: {len(ids)} ids, {len(set(ids))} unique, {len(listed)} stored, "
+          f"{rolled} in rollups, first campaign id {campaign} -> {'OK' if ok else 'FAILED'}")
+    return ok
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=200, help='writes per thread')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'stress.db')
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=worker_process, args=(path, args.threads, args.rows, results))
+                     for _ in range(args.processes)]
+        for process in processes:
+            process.start()
+        ids = sum((results.get() for _ in processes), [])
+        for process in processes:
+            process.join()
+        sqlite_ok = check(f"sqlite ({args.processes} processes x {args.threads} threads)", ids, SQLiteStorage(path))
+
+    memory = MemoryStorage()
+    ids = run_threads(memory, args.processes * args.threads, args.rows)
+    memory_ok = check(f"memory ({args.processes * args.threads} threads)", ids, memory)
+    return 0 if sqlite_ok and memory_ok else 1
+
+if __name__ == '__main__':
+    sys.exit(main())